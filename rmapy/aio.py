@@ -0,0 +1,171 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Union, Optional, Iterable, List, AsyncIterator
+from .api import Client
+from .collections import Collection
+from .document import Document, ZipDocument
+from .folder import Folder
+from .watch import ChangeEvent, PollInterval, index, diff
+from .const import POOL_MAXSIZE, WATCH_MIN_INTERVAL, WATCH_MAX_INTERVAL
+
+DocumentOrFolder = Union[Document, Folder]
+
+
+class AsyncClient(object):
+    """Asyncio API Client for Remarkable Cloud
+
+    This mirrors the API of :class:`rmapy.api.Client` with awaitable methods.
+    It is a thread pool wrapper, not a native asyncio client: every call
+    runs the blocking :class:`rmapy.api.Client` method on one of
+    ``concurrency`` worker threads, all sharing the pooled connections of a
+    single client. Keep concurrency in the tens, every call in flight holds
+    an OS thread.
+
+    Attributes:
+        client: The Client doing the actual requests.
+        concurrency: The maximum number of requests in flight.
+    """
+
+    def __init__(self, client: Optional[Client] = None,
+                 concurrency: Optional[int] = None):
+        """Create a new AsyncClient
+
+        Args:
+            client: The Client to wrap. If None, a new Client is created with
+                a connection pool matching the concurrency, and closed by
+                :meth:`close`. A given client is left open.
+            concurrency: The maximum number of requests in flight. Defaults
+                to the default connection pool size.
+        """
+
+        if not concurrency:
+            concurrency = POOL_MAXSIZE
+        self._owns_client = client is None
+        if client is None:
+            client = Client(pool_maxsize=concurrency)
+        self.client = client
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    async def __aenter__(self) -> "AsyncClient":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Wait for running requests, and close the wrapped client if it
+        was created by this AsyncClient."""
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, partial(self._executor.shutdown,
+                                                 wait=True))
+        if self._owns_client:
+            self.client.close()
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor,
+                                          partial(func, *args, **kwargs))
+
+    async def renew_token(self):
+        """See :meth:`rmapy.api.Client.renew_token`"""
+
+        return await self._run(self.client.renew_token)
+
+    def is_auth(self) -> bool:
+        """See :meth:`rmapy.api.Client.is_auth`"""
+
+        return self.client.is_auth()
+
+    async def get_meta_items(self, **kwargs) -> Collection:
+        """See :meth:`rmapy.api.Client.get_meta_items`"""
+
+        return await self._run(self.client.get_meta_items, **kwargs)
+
+    async def watch(self, min_interval: float = WATCH_MIN_INTERVAL,
+                    max_interval: float = WATCH_MAX_INTERVAL,
+                    backoff: float = 2.0,
+                    initial: bool = False) -> AsyncIterator[ChangeEvent]:
+        """See :meth:`rmapy.api.Client.watch`"""
+
+        interval = PollInterval(min_interval, max_interval, backoff)
+        if initial:
+            previous = {}
+        else:
+            previous = index(await self.get_meta_items())
+            await asyncio.sleep(interval.value)
+        while True:
+            events, previous = diff(previous, await self.get_meta_items())
+            for event in events:
+                yield event
+            await asyncio.sleep(interval.update(bool(events)))
+
+    async def get_doc(self, _id: str) -> Optional[DocumentOrFolder]:
+        """See :meth:`rmapy.api.Client.get_doc`"""
+
+        return await self._run(self.client.get_doc, _id)
+
+    async def download(self, document: Document) -> ZipDocument:
+        """See :meth:`rmapy.api.Client.download`"""
+
+        return await self._run(self.client.download, document)
+
+    async def download_to(self, document: Document, *args, **kwargs):
+        """See :meth:`rmapy.api.Client.download_to`"""
+
+        return await self._run(self.client.download_to, document,
+                               *args, **kwargs)
+
+    async def download_many(self, documents: Iterable[Document],
+                            dest_dir: str, **kwargs):
+        """See :meth:`rmapy.api.Client.download_many`"""
+
+        return await self._run(self.client.download_many, documents,
+                               dest_dir, **kwargs)
+
+    async def delete(self, doc: DocumentOrFolder):
+        """See :meth:`rmapy.api.Client.delete`"""
+
+        return await self._run(self.client.delete, doc)
+
+    async def delete_many(self, items: Iterable[DocumentOrFolder],
+                          **kwargs) -> List[DocumentOrFolder]:
+        """See :meth:`rmapy.api.Client.delete_many`"""
+
+        return await self._run(self.client.delete_many, items, **kwargs)
+
+    async def upload(self, zip_doc: ZipDocument, to: Folder = Folder(ID="")):
+        """See :meth:`rmapy.api.Client.upload`"""
+
+        return await self._run(self.client.upload, zip_doc, to)
+
+    async def upload_version(self, zip_doc: ZipDocument, version: int):
+        """See :meth:`rmapy.api.Client.upload_version`"""
+
+        return await self._run(self.client.upload_version, zip_doc, version)
+
+    async def upload_many(self, zip_docs: Iterable[ZipDocument],
+                          **kwargs) -> List[Document]:
+        """See :meth:`rmapy.api.Client.upload_many`"""
+
+        return await self._run(self.client.upload_many, zip_docs, **kwargs)
+
+    async def update_metadata(self, docorfolder: DocumentOrFolder, **kwargs):
+        """See :meth:`rmapy.api.Client.update_metadata`"""
+
+        return await self._run(self.client.update_metadata, docorfolder,
+                               **kwargs)
+
+    async def update_metadata_many(self, items: Iterable[DocumentOrFolder],
+                                   **kwargs) -> List[DocumentOrFolder]:
+        """See :meth:`rmapy.api.Client.update_metadata_many`"""
+
+        return await self._run(self.client.update_metadata_many, items,
+                               **kwargs)
+
+    async def create_folder(self, folder: Folder):
+        """See :meth:`rmapy.api.Client.create_folder`"""
+
+        return await self._run(self.client.create_folder, folder)
@@ -1,12 +1,29 @@
+import os
+import shutil
 import requests
+from requests.adapters import HTTPAdapter, BaseAdapter
 from logging import getLogger
 from datetime import datetime
-from typing import Union, Optional
+from typing import (Union, Optional, List, Dict, Iterable, Callable,
+                    Iterator, Tuple)
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from threading import Lock
+from tempfile import TemporaryFile, SpooledTemporaryFile, mkstemp
+from time import sleep
 from uuid import uuid4
 from .collections import Collection
 from .config import load, dump
-from .document import Document, ZipDocument, from_request_stream
+from .document import (Document,
+                       ZipDocument,
+                       FileOrPath,
+                       from_request_stream,
+                       from_zip,
+                       to_file,)
 from .folder import Folder
+from .transfer import ByteBudget, TransferSummary
+from .cache import BlobURLCache, MetaCache, BlobStore
+from .watch import ChangeEvent, PollInterval, index, diff
 from .exceptions import (
     AuthError,
     DocumentNotFound,
@@ -17,7 +34,15 @@ from .const import (RFC3339Nano,
                     BASE_URL,
                     DEVICE_TOKEN_URL,
                     USER_TOKEN_URL,
-                    DEVICE,)
+                    DEVICE,
+                    POOL_CONNECTIONS,
+                    POOL_MAXSIZE,
+                    BATCH_SIZE,
+                    CHUNK_SIZE,
+                    MAX_INFLIGHT_BYTES,
+                    SPOOL_SIZE,
+                    WATCH_MIN_INTERVAL,
+                    WATCH_MAX_INTERVAL,)
 
 log = getLogger("rmapy")
 DocumentOrFolder = Union[Document, Folder]
@@ -28,6 +53,19 @@ class Client(object):
 
     This allows you to authenticate & communicate with the Remarkable Cloud
     and does all the heavy lifting for you.
+
+    All requests go through a single :class:`requests.Session`, so TCP & TLS
+    connections are kept alive and re-used between calls.
+
+    Attributes:
+        session: The session all requests are sent with.
+        optimistic: Use optimistic versioning when updating metadata.
+        version_fallbacks: How many times an optimistic update was rejected
+            because of a version conflict and the current version had to be
+            fetched.
+        url_cache: The cache of signed blob urls used for downloads.
+        blob_store: An optional store of downloaded zipfiles by document
+            version.
     """
 
     token_set = {
@@ -35,13 +73,66 @@ class Client(object):
         "usertoken": ""
     }
 
-    def __init__(self):
+    def __init__(self,
+                 pool_connections: int = POOL_CONNECTIONS,
+                 pool_maxsize: int = POOL_MAXSIZE,
+                 adapter: Optional[BaseAdapter] = None,
+                 session: Optional[requests.Session] = None,
+                 optimistic: bool = False,
+                 url_cache: Optional[BlobURLCache] = None,
+                 blob_store: Optional[BlobStore] = None):
+        """Create a new Client
+
+        Args:
+            pool_connections: The number of hosts to keep a connection pool
+                for.
+            pool_maxsize: The maximum number of connections kept alive per
+                host.
+            adapter: A custom transport adapter to mount for http & https.
+                When given, pool_connections & pool_maxsize are ignored.
+            session: A session to use instead of creating a new one. Its
+                own adapters are kept, unless an adapter is given, and
+                pool_connections & pool_maxsize are not applied to it.
+            optimistic: Use the Version of a Document or Folder when
+                updating metadata, instead of fetching the current version
+                first.
+            url_cache: A cache of signed blob urls to share between clients.
+            blob_store: A store to keep downloaded zipfiles in, so unchanged
+                documents are not downloaded again.
+        """
+
         config = load()
         if "devicetoken" in config:
             self.token_set["devicetoken"] = config["devicetoken"]
         if "usertoken" in config:
             self.token_set["usertoken"] = config["usertoken"]
 
+        if session is None:
+            session = requests.Session()
+            if adapter is None:
+                adapter = HTTPAdapter(pool_connections=pool_connections,
+                                      pool_maxsize=pool_maxsize)
+        if adapter is not None:
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+        self.optimistic = optimistic
+        self.version_fallbacks = 0
+        self._lock = Lock()
+        self.url_cache = url_cache if url_cache is not None else BlobURLCache()
+        self.blob_store = blob_store
+
+    def __enter__(self) -> "Client":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the session and all pooled connections."""
+
+        self.session.close()
+
     def request(self, method: str, path: str,
                 data=None,
                 body=None, headers=None,
@@ -83,12 +174,12 @@ class Client(object):
         for k in headers.keys():
             _headers[k] = headers[k]
         log.debug(url, _headers)
-        r = requests.request(method, url,
-                             json=body,
-                             data=data,
-                             headers=_headers,
-                             params=params,
-                             stream=stream)
+        r = self.session.request(method, url,
+                                 json=body,
+                                 data=data,
+                                 headers=_headers,
+                                 params=params,
+                                 stream=stream)
         return r
 
     def register_device(self, code: str):
@@ -163,25 +254,157 @@ class Client(object):
         else:
             return False
 
-    def get_meta_items(self) -> Collection:
+    def get_meta_items(self, with_blob: bool = False) -> Collection:
         """Returns a new collection from meta items.
 
         It fetches all meta items from the Remarkable Cloud and stores them
         in a collection, wrapping them in the correct class.
 
+        Args:
+            with_blob: Also fetch the BlobURLGet of every item, so they can
+                be downloaded without fetching them one by one. The urls
+                expire at BlobURLGetExpires.
+
         Returns:
             Collection: a collection of Documents & Folders from the Remarkable
                 Cloud
         """
 
-        response = self.request("GET", "/document-storage/json/2/docs")
+        params = {"withBlob": True} if with_blob else None
+        response = self.request("GET", "/document-storage/json/2/docs",
+                                params=params)
+        collection = Collection()
+        items = response.json()
+        log.debug(f"Got {len(items)} meta items")
+        for item in items:
+            collection.add(item)
+        if with_blob:
+            self.url_cache.update(i for i in collection
+                                  if isinstance(i, Document))
+
+        return collection
+
+    def get_cached_meta_items(self, cache: Optional[MetaCache] = None,
+                              background: bool = True) -> Collection:
+        """Returns a collection from the cached meta items.
+
+        The collection is built from the listing cached on disk, and then
+        refreshed from the Remarkable Cloud. The listing is requested
+        conditionally, so an unchanged listing is not transferred again.
+        Changes are applied to the collection in place with
+        :meth:`rmapy.collections.Collection.update`.
+
+        When there is no cached listing yet, the refresh is done before
+        returning.
+
+        Args:
+            cache: The cache to use. Defaults to a MetaCache in the home
+                directory.
+            background: Request the listing in a background thread. The
+                changes are applied by :meth:`rmapy.cache.MetaCache.wait`,
+                which also raises any error of the request. The cache is
+                also set as the refresh attribute of the collection, so
+                ``collection.refresh.wait()`` works with the default cache.
+
+        Returns:
+            Collection: a collection of Documents & Folders from the cache.
+        """
+
+        if cache is None:
+            cache = MetaCache()
         collection = Collection()
-        log.debug(response.text)
-        for item in response.json():
+        for item in cache.load():
             collection.add(item)
 
+        if background and len(collection):
+            cache.refresh_in_background(
+                partial(self._fetch_meta_items, cache),
+                partial(self._apply_meta_items, collection))
+            collection.refresh = cache
+        else:
+            self.refresh_meta_items(collection, cache)
         return collection
 
+    def refresh_meta_items(self, collection: Collection,
+                           cache: MetaCache) -> bool:
+        """Refresh a cached collection from the Remarkable Cloud.
+
+        Args:
+            collection: The collection to update in place.
+            cache: The cache the collection was loaded from.
+        Returns:
+            True if the listing changed since it was cached.
+        """
+
+        items = self._fetch_meta_items(cache)
+        if items is None:
+            return False
+        self._apply_meta_items(collection, items)
+        return True
+
+    def _fetch_meta_items(self, cache: MetaCache) -> Optional[List[dict]]:
+        """Request the listing conditionally and cache a new listing.
+
+        Returns:
+            The new listing, or None if it did not change.
+        """
+
+        response = self.request("GET", "/document-storage/json/2/docs",
+                                headers=cache.headers())
+        if response.status_code == 304:
+            log.debug("Meta items not modified")
+            return None
+        if not response.ok:
+            raise ApiError(
+                f"Got An invalid HTTP Response: {response.status_code}",
+                response=response)
+        items = response.json()
+        cache.dump(items,
+                   response.headers.get("ETag", ""),
+                   response.headers.get("Last-Modified", ""))
+        return items
+
+    @staticmethod
+    def _apply_meta_items(collection: Collection, items: List[dict]) -> None:
+        added, changed, removed = collection.update(items)
+        log.debug(f"Got {len(items)} meta items: {len(added)} added, "
+                  f"{len(changed)} changed, {len(removed)} removed")
+
+    def watch(self, min_interval: float = WATCH_MIN_INTERVAL,
+              max_interval: float = WATCH_MAX_INTERVAL,
+              backoff: float = 2.0,
+              initial: bool = False) -> Iterator[ChangeEvent]:
+        """Watch the Remarkable Cloud for changes.
+
+        This polls the meta items and yields a
+        :class:`rmapy.watch.ChangeEvent` for every item created, modified,
+        moved or deleted since the previous poll. Polling speeds up to
+        min_interval while there are changes and slows down to
+        max_interval when idle.
+
+        Args:
+            min_interval: The shortest number of seconds between polls.
+            max_interval: The longest number of seconds between polls.
+            backoff: The factor the interval grows with after an idle poll.
+            initial: Yield a created event for every item of the first
+                listing.
+
+        Yields:
+            The changes, as they are found.
+        """
+
+        interval = PollInterval(min_interval, max_interval, backoff)
+        if initial:
+            previous: Dict[str, Tuple[int, str, str]] = {}
+        else:
+            previous = index(self.get_meta_items())
+            sleep(interval.value)
+        while True:
+            events, previous = diff(previous, self.get_meta_items())
+            for event in events:
+                yield event
+            sleep(interval.update(bool(events)))
+
     def get_doc(self, _id: str) -> Optional[DocumentOrFolder]:
         """Get a meta item by ID
 
@@ -210,7 +433,9 @@ class Client(object):
             if data_response[0]["Type"] == "CollectionType":
                 return Folder(**data_response[0])
             elif data_response[0]["Type"] == "DocumentType":
-                return Document(**data_response[0])
+                doc = Document(**data_response[0])
+                self.url_cache.put(doc)
+                return doc
         else:
             raise DocumentNotFound(f"Could not find document {_id}")
         return None
@@ -225,23 +450,212 @@ class Client(object):
         Args:
             document: A Document instance we should download
 
+        When the client has a blob store, the zipfile is kept in the store
+        and opened from there, without any request when it is already
+        stored for the version of the document.
+
         Returns:
             A ZipDocument instance, containing the raw data files from a
             document.
         """
 
-        if not document.BlobURLGet:
-            doc = self.get_doc(document.ID)
-            if isinstance(doc, Document):
-                document = doc
-            else:
-                raise UnsupportedTypeError(
-                    "We expected a document, got {type}"
-                    .format(type=type(doc)))
+        if self.blob_store is not None and document.Version:
+            return from_zip(document.ID, self._stored_blob(document))
+        document = self._with_blob_url(document)
         log.debug("BLOB", document.BlobURLGet)
         r = self.request("GET", document.BlobURLGet, stream=True)
         return from_request_stream(document.ID, r)
 
+    def _stored_blob(self, document: Document) -> str:
+        """Return the zipfile of a document from the blob store.
+
+        The zipfile is downloaded into the store first if needed.
+        """
+
+        path = self.blob_store.get(document.ID, document.Version)
+        if path is not None:
+            return path
+        fd, tmp = mkstemp(suffix=".part", dir=self.blob_store.directory)
+        os.close(fd)
+        try:
+            self._stream_to(document, tmp, CHUNK_SIZE)
+        except Exception:
+            os.remove(tmp)
+            raise
+        return self.blob_store.put(document.ID, document.Version, tmp,
+                                   move=True)
+
+    def download_to(self, document: Document,
+                    file: Optional[FileOrPath] = None,
+                    chunk_size: int = CHUNK_SIZE) -> FileOrPath:
+        """Download the raw zipfile of a document to a file
+
+        Unlike :meth:`download`, the zipfile is streamed to the file chunk by
+        chunk, so memory use does not grow with the size of the document.
+        Open the result with :func:`rmapy.document.from_zip`. When the client
+        has a blob store, the zipfile is copied from the store.
+
+        Args:
+            document: A Document instance we should download
+            file: A file location or a file object to write to. If None, a
+                temporary file is used.
+            chunk_size: The size of the chunks to write.
+
+        Returns:
+            The file location, or the file object positioned at the start.
+        Raises:
+            ApiError: an error occurred while downloading the document.
+        """
+
+        if self.blob_store is not None and document.Version:
+            path = self._stored_blob(document)
+            if isinstance(file, (str, os.PathLike)):
+                shutil.copyfile(path, file)
+                return file
+            if file is None:
+                file = SpooledTemporaryFile(max_size=SPOOL_SIZE)
+            with open(path, 'rb') as f:
+                shutil.copyfileobj(f, file, chunk_size)
+            file.seek(0)
+            return file
+        return self._stream_to(document, file, chunk_size)
+
+    def _stream_to(self, document: Document, file: Optional[FileOrPath],
+                   chunk_size: int) -> FileOrPath:
+        document = self._with_blob_url(document)
+        with self.request("GET", document.BlobURLGet, stream=True) as r:
+            if not r.ok:
+                raise ApiError(
+                    f"Got An invalid HTTP Response: {r.status_code}",
+                    response=r)
+            return to_file(r, file, chunk_size)
+
+    def download_many(self, documents: Iterable[Document], dest_dir: str,
+                      workers: int = POOL_MAXSIZE,
+                      max_inflight_bytes: int = MAX_INFLIGHT_BYTES,
+                      progress: Optional[Callable[[int, int, Document],
+                                                  None]] = None,
+                      chunk_size: int = CHUNK_SIZE) -> TransferSummary:
+        """Download the raw zipfiles of many documents to a directory
+
+        The documents are streamed to dest_dir/<ID>.zip by a pool of
+        workers. A document only starts downloading when its size fits in
+        max_inflight_bytes together with the downloads already running.
+
+        A failed document does not stop the others, but is recorded in the
+        errors of the returned summary.
+
+        Args:
+            documents: Document instances we should download
+            dest_dir: The directory to download to.
+            workers: The number of documents to download in parallel.
+            max_inflight_bytes: The maximum number of bytes of all running
+                downloads together.
+            progress: Called with (done, total, document) after every
+                document, failed or not.
+            chunk_size: The size of the chunks to write.
+
+        Returns:
+            A TransferSummary with the downloaded locations, the errors and
+            the throughput.
+        """
+
+        documents = list(documents)
+        self.refresh_blob_urls(documents)
+        os.makedirs(dest_dir, exist_ok=True)
+        budget = ByteBudget(max_inflight_bytes)
+        summary = TransferSummary()
+        done = []
+
+        def fetch(document: Document) -> None:
+            location = os.path.join(dest_dir, f"{document.ID}.zip")
+            try:
+                stored = None
+                if self.blob_store is not None and document.Version:
+                    stored = self.blob_store.get(document.ID,
+                                                 document.Version)
+                if stored is not None:
+                    shutil.copyfile(stored, location)
+                    summary.add(document.ID, location,
+                                os.path.getsize(location))
+                    return
+                document = self._with_blob_url(document)
+                with self.request("GET", document.BlobURLGet,
+                                  stream=True) as r:
+                    if not r.ok:
+                        raise ApiError(
+                            f"Got An invalid HTTP Response: {r.status_code}",
+                            response=r)
+                    size = int(r.headers.get("Content-Length") or chunk_size)
+                    size = min(size, max_inflight_bytes)
+                    budget.acquire(size)
+                    try:
+                        to_file(r, location + ".part", chunk_size)
+                    finally:
+                        budget.release(size)
+                os.replace(location + ".part", location)
+                if self.blob_store is not None and document.Version:
+                    self.blob_store.put(document.ID, document.Version,
+                                        location)
+                summary.add(document.ID, location,
+                            os.path.getsize(location))
+            except Exception as e:
+                log.error(f"Could not download {document.ID}: {e}")
+                summary.fail(document.ID, e)
+            finally:
+                with self._lock:
+                    done.append(document.ID)
+                    count = len(done)
+                if progress:
+                    progress(count, len(documents), document)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(fetch, documents))
+        summary.finish()
+        return summary
+
+    def _with_blob_url(self, document: Document) -> Document:
+        """Return the document with a BlobURLGet that is not about to expire.
+
+        The url is looked up in the url cache first, and fetched with
+        get_doc otherwise.
+        """
+
+        if not document.blob_url_get_expired(self.url_cache.margin):
+            self.url_cache.put(document)
+        cached = self.url_cache.get(document.ID, document.Version)
+        if cached:
+            document.BlobURLGet, document.BlobURLGetExpires = cached
+            return document
+
+        doc = self.get_doc(document.ID)
+        if isinstance(doc, Document):
+            return doc
+        else:
+            raise UnsupportedTypeError(
+                "We expected a document, got {type}"
+                .format(type=type(doc)))
+
+    def refresh_blob_urls(self, documents: Iterable[Document]) -> int:
+        """Fetch the blob urls of many documents at once
+
+        When more than one of the documents has no usable url in the url
+        cache, all urls are refreshed with a single listing call instead of
+        a get_doc call per document.
+
+        Args:
+            documents: The documents that are about to be downloaded.
+        Returns:
+            The number of documents that were missing a url.
+        """
+
+        missing = self.url_cache.missing(documents)
+        if len(missing) > 1:
+            collection = self.get_meta_items(with_blob=True)
+            self.url_cache.update(i for i in collection
+                                  if isinstance(i, Document))
+        return len(missing)
+
     def delete(self, doc: DocumentOrFolder):
         """Delete a document from the cloud.
 
@@ -259,10 +673,58 @@ class Client(object):
 
         return self.check_response(response)
 
+    def delete_many(self, items: Iterable[DocumentOrFolder],
+                    batch_size: int = BATCH_SIZE,
+                    workers: int = 1) -> List[DocumentOrFolder]:
+        """Delete many documents or folders from the cloud.
+
+        The items are sent in batches of batch_size items per request.
+        Like :meth:`update_metadata_many`, this does not raise on a failed
+        item, but sets the Success & Message attributes of every item.
+
+        Args:
+            items: Documents or folders to delete.
+            batch_size: The maximum number of items per request.
+            workers: The number of requests to send in parallel.
+        Returns:
+            The items, with Success & Message set.
+        """
+
+        items = list(items)
+        body = [{"ID": i.ID, "Version": i.Version} for i in items]
+        self._send_batches("/document-storage/json/2/delete",
+                           items, body, batch_size, workers)
+        return items
+
+    def delete_tree(self, folder: Folder,
+                    collection: Optional[Collection] = None,
+                    **kwargs) -> List[DocumentOrFolder]:
+        """Delete a folder with everything in it.
+
+        The contents are looked up with :meth:`Collection.walk` and
+        deleted with :meth:`delete_many`, the deepest items first.
+
+        Args:
+            folder: The folder to delete.
+            collection: The collection to look up the contents in. If None,
+                it is fetched from the cloud.
+            **kwargs: passed on to :meth:`delete_many`.
+        Returns:
+            The deleted items, with Success & Message set.
+        """
+
+        if collection is None:
+            collection = self.get_meta_items()
+        items: List[DocumentOrFolder] = [folder]
+        items.extend(collection.walk(folder))
+        items.reverse()
+        return self.delete_many(items, **kwargs)
+
     def upload(self, zip_doc: ZipDocument, to: Folder = Folder(ID="")):
         """Upload a document to the cloud.
 
-        Add a new document to the Remarkable Cloud.
+        Add a new document to the Remarkable Cloud. The zipfile is built in
+        a temporary file on disk and streamed from there.
 
         Args:
             zip_doc: A ZipDocument instance containing the data of a Document.
@@ -273,10 +735,7 @@ class Client(object):
         """
 
         blob_url_put = self._upload_request(zip_doc)
-        zip_doc.dump(zip_doc.zipfile)
-        response = self.request("PUT", blob_url_put, data=zip_doc.zipfile.read())
-        # Reset seek
-        zip_doc.zipfile.seek(0)
+        response = self._put_blob(blob_url_put, zip_doc)
         if response.ok:
             doc = Document(**zip_doc.metadata)
             doc.ID = zip_doc.ID
@@ -286,24 +745,262 @@ class Client(object):
             raise ApiError("an error occured while uploading the document.",
                            response=response)
 
-    def update_metadata(self, docorfolder: DocumentOrFolder):
+    def upload_version(self, zip_doc: ZipDocument, version: int) -> None:
+        """Upload a new zipfile for an existing document.
+
+        Only the zipfile is replaced. The new version is published by the
+        next metadata update with :meth:`update_metadata` or
+        :meth:`update_metadata_many`.
+
+        Args:
+            zip_doc: The new content, with the ID of the document.
+            version: The version to upload, one more than the current
+                version of the document.
+        Raises:
+            ApiError: an error occurred while uploading the document.
+        """
+
+        zip_doc.metadata["version"] = int(version)
+        blob_url_put = self._upload_request(zip_doc)
+        response = self._put_blob(blob_url_put, zip_doc)
+        if not response.ok:
+            raise ApiError("an error occured while uploading the document.",
+                           response=response)
+
+    def upload_many(self, zip_docs: Iterable[ZipDocument],
+                    to: Folder = Folder(ID=""),
+                    batch_size: int = BATCH_SIZE,
+                    workers: int = POOL_MAXSIZE) -> List[Document]:
+        """Upload many documents to the cloud.
+
+        This sends one upload request for all documents, uploads the blobs
+        in parallel and finishes with one batched metadata update. As the
+        documents were just created, their version is not looked up.
+
+        Like :meth:`update_metadata_many`, this does not raise on a failed
+        document, but sets the Success & Message attributes of every
+        returned document.
+
+        Args:
+            zip_docs: ZipDocument instances containing the data of the
+                documents.
+            to: the parent of the documents. (Default root)
+            batch_size: The maximum number of documents per request.
+            workers: The number of blobs to upload in parallel.
+        Returns:
+            A Document for every ZipDocument, with Success & Message set.
+        """
+
+        zip_docs = list(zip_docs)
+        docs = []
+        for zip_doc in zip_docs:
+            doc = Document(**zip_doc.metadata)
+            doc.ID = zip_doc.ID
+            doc.Parent = to.ID
+            docs.append(doc)
+
+        body = [zip_doc.create_request()[1] for zip_doc in zip_docs]
+        self._send_batches("/document-storage/json/2/upload/request",
+                           docs, body, batch_size)
+
+        def put(doc: Document, zip_doc: ZipDocument) -> None:
+            if not doc.Success:
+                return
+            if not doc.BlobURLPut:
+                doc.Success = False
+                doc.Message = "BlobURLPut is not set"
+                return
+            res = self._put_blob(doc.BlobURLPut, zip_doc)
+            if not res.ok:
+                doc.Success = False
+                doc.Message = ("an error occured while uploading the "
+                               f"document: {res.status_code}")
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(put, docs, zip_docs))
+
+        uploaded = [d for d in docs if d.Success]
+        versions = {d.ID: d.Version - 1 for d in uploaded}
+        self._update_status(uploaded, versions, batch_size)
+        return docs
+
+    def _put_blob(self, url: str, zip_doc: ZipDocument) -> requests.Response:
+        """Dump a ZipDocument to a temporary file and stream it to url."""
+
+        with TemporaryFile() as tmp:
+            zip_doc.dump(tmp)
+            tmp.seek(0)
+            return self.request("PUT", url, data=tmp)
+
+    def update_metadata(self, docorfolder: DocumentOrFolder,
+                        optimistic: Optional[bool] = None):
         """Send an update of the current metadata of a meta object
 
         Update the meta item.
 
+        In optimistic mode, the Version of the item itself is used and the
+        current version is only fetched when the Remarkable Cloud rejects the
+        update because of a version conflict.
+
         Args:
             docorfolder: A document or folder to update the meta information
                 from.
+            optimistic: Use optimistic versioning. Defaults to the optimistic
+                setting of the client.
         """
 
+        if optimistic is None:
+            optimistic = self.optimistic
         req = docorfolder.to_dict()
-        req["Version"] = self.get_current_version(docorfolder) + 1
         req["ModifiedClient"] = datetime.utcnow().strftime(RFC3339Nano)
-        res = self.request("PUT",
-                           "/document-storage/json/2/upload/update-status",
-                           body=[req])
+        if optimistic:
+            req["Version"] = int(docorfolder.Version) + 1
+            res = self.request("PUT",
+                               "/document-storage/json/2/upload/update-status",
+                               body=[req])
+            if self._is_version_conflict(res):
+                self._count_version_fallbacks(1)
+                req["Version"] = self.get_current_version(docorfolder) + 1
+                res = self.request(
+                    "PUT", "/document-storage/json/2/upload/update-status",
+                    body=[req])
+        else:
+            req["Version"] = self.get_current_version(docorfolder) + 1
+            res = self.request("PUT",
+                               "/document-storage/json/2/upload/update-status",
+                               body=[req])
+
+        result = self.check_response(res)
+        docorfolder.Version = req["Version"]
+        return result
+
+    def update_metadata_many(self, items: Iterable[DocumentOrFolder],
+                             batch_size: int = BATCH_SIZE,
+                             optimistic: Optional[bool] = None,
+                             retry: bool = True
+                             ) -> List[DocumentOrFolder]:
+        """Send an update of the metadata of many meta objects
+
+        The current versions are fetched in a single listing call and the
+        updates are sent in batches of batch_size items per request.
+        In optimistic mode, the Version of the items is used and the current
+        versions are only fetched to retry the items rejected because of a
+        version conflict.
+
+        Unlike :meth:`update_metadata`, this does not raise on a failed item.
+        The Success & Message attributes of every item are set to the result
+        the Remarkable Cloud returned for it instead.
+
+        Args:
+            items: Documents or folders to update the meta information from.
+            batch_size: The maximum number of items per request.
+            optimistic: Use optimistic versioning. Defaults to the optimistic
+                setting of the client.
+            retry: Retry the items rejected because of a version conflict
+                with the current versions. If False, they are left failed
+                with Conflict set, so a concurrent change is not
+                overwritten.
+        Returns:
+            The items, with Success, Message & Conflict set.
+        """
+
+        if optimistic is None:
+            optimistic = self.optimistic
+        items = list(items)
+        if not optimistic:
+            versions = self.get_current_versions()
+            return self._update_status(items, versions, batch_size)
+
+        versions = {i.ID: int(i.Version) for i in items}
+        self._update_status(items, versions, batch_size)
+        conflicts = [i for i in items if i.Conflict]
+        if conflicts and retry:
+            self._count_version_fallbacks(len(conflicts))
+            versions = self.get_current_versions()
+            self._update_status(conflicts, versions, batch_size)
+        return items
+
+    def get_current_versions(self) -> Dict[str, int]:
+        """Get the latest version info of all meta items
+
+        This fetches all meta items in one call, without blob urls.
+
+        Returns:
+            a dict mapping the ID of every meta item to its version.
+        """
+
+        response = self.request("GET", "/document-storage/json/2/docs")
+        if not response.ok:
+            raise ApiError(
+                f"Got An invalid HTTP Response: {response.status_code}",
+                response=response)
+        return {i["ID"]: int(i["Version"]) for i in response.json()}
+
+    def _update_status(self, items: List[DocumentOrFolder],
+                       versions: Dict[str, int],
+                       batch_size: int) -> List[DocumentOrFolder]:
+        modified = datetime.utcnow().strftime(RFC3339Nano)
+        body = []
+        for item in items:
+            req = item.to_dict()
+            req["Version"] = versions.get(item.ID, 0) + 1
+            req["ModifiedClient"] = modified
+            body.append(req)
+        self._send_batches("/document-storage/json/2/upload/update-status",
+                           items, body, batch_size)
+        return items
+
+    def _send_batches(self, path: str, items: List[DocumentOrFolder],
+                      body: List[dict], batch_size: int,
+                      workers: int = 1) -> None:
+        """PUT body to path in chunks, applying the results to the items."""
+
+        def send(start: int) -> None:
+            chunk_body = body[start:start + batch_size]
+            res = self.request("PUT", path, body=chunk_body)
+            self._apply_results(items[start:start + batch_size],
+                                chunk_body, res)
+
+        starts = range(0, len(items), batch_size)
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(send, starts))
+        else:
+            for start in starts:
+                send(start)
 
-        return self.check_response(res)
+    @staticmethod
+    def _apply_results(items: List[DocumentOrFolder], body: List[dict],
+                       response: requests.Response) -> None:
+        """Set Success & Message on items from a bulk API response."""
+
+        if not response.ok:
+            msg = f"Got An invalid HTTP Response: {response.status_code}"
+            log.error(msg)
+            for item in items:
+                item.Success = False
+                item.Message = msg
+                item.Conflict = Client._is_conflict(response.status_code,
+                                                    None)
+            return
+
+        results = {r.get("ID"): r for r in response.json()}
+        for item, req in zip(items, body):
+            result = results.get(item.ID)
+            if result is None:
+                item.Success = False
+                item.Message = "Missing from the response"
+            else:
+                item.Success = bool(result.get("Success", False))
+                item.Message = result.get("Message", "")
+            item.Conflict = Client._is_conflict(response.status_code, result)
+            if item.Success:
+                item.Version = req["Version"]
+                for k in ("BlobURLPut", "BlobURLPutExpires"):
+                    if result.get(k):
+                        setattr(item, k, result[k])
+            else:
+                log.error(f"{item.ID}: {item.Message}")
 
     def get_current_version(self, docorfolder: DocumentOrFolder) -> int:
         """Get the latest version info from a Document or Folder
@@ -381,6 +1078,38 @@ class Client(object):
             self.update_metadata(folder)
         return True
 
+    def _count_version_fallbacks(self, count: int) -> None:
+        with self._lock:
+            self.version_fallbacks += count
+
+    @staticmethod
+    def _is_version_conflict(response: requests.Response) -> bool:
+        """Did the Remarkable Cloud reject an update because of its version"""
+
+        if not response.ok:
+            return Client._is_conflict(response.status_code, None)
+        try:
+            result = response.json()[0]
+        except (ValueError, IndexError, KeyError):
+            return False
+        return Client._is_conflict(response.status_code, result)
+
+    @staticmethod
+    def _is_conflict(status_code: int, result: Optional[dict]) -> bool:
+        """Was an item rejected because of its version
+
+        Args:
+            status_code: The status code of the response.
+            result: The result of the item in the response, if any.
+        """
+
+        if status_code == 409:
+            return True
+        if result is None:
+            return False
+        return (not result.get("Success", False)
+                and "version" in result.get("Message", "").lower())
+
     @staticmethod
     def check_response(response: requests.Response):
         """Check the response from an API Call
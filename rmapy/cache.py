@@ -0,0 +1,415 @@
+import os
+import json
+import shutil
+import hashlib
+from time import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from threading import Lock, Thread
+from typing import Callable, Dict, Iterable, Optional, Tuple, List
+from .meta import Meta, parse_datetime
+from .const import BLOB_URL_MARGIN, BLOB_STORE_SIZE, CHUNK_SIZE
+
+
+class BlobURLCache(object):
+    """A cache of signed blob urls
+
+    The urls are keyed by (ID, Version) and handed out until margin seconds
+    before they expire.
+
+    Attributes:
+        margin: The number of seconds before the expiration date a url is
+            not handed out anymore.
+        hits: The number of lookups that returned a url.
+        misses: The number of lookups that did not.
+    """
+
+    def __init__(self, margin: int = BLOB_URL_MARGIN):
+        self.margin = margin
+        self.hits = 0
+        self.misses = 0
+        self._urls: Dict[Tuple[str, int], Tuple[str, str]] = {}
+        self._lock = Lock()
+
+    def put(self, meta: Meta) -> None:
+        """Store the BlobURLGet of a meta item
+
+        Args:
+            meta: A Document with a BlobURLGet.
+        """
+
+        if not meta.BlobURLGet:
+            return
+        with self._lock:
+            self._urls[(meta.ID, int(meta.Version))] = (
+                meta.BlobURLGet, meta.BlobURLGetExpires)
+
+    def update(self, items: Iterable[Meta]) -> None:
+        """Store the BlobURLGet of many meta items
+
+        Args:
+            items: Documents with a BlobURLGet.
+        """
+
+        for item in items:
+            self.put(item)
+
+    def get(self, _id: str, version: int) -> Optional[Tuple[str, str]]:
+        """Look up a url that is not about to expire
+
+        Args:
+            _id: The ID of the document.
+            version: The version of the document.
+        Returns:
+            A tuple of the url and its expiration date, or None.
+        """
+
+        key = (_id, int(version))
+        with self._lock:
+            entry = self._urls.get(key)
+            if entry is not None and self._expired(entry[1]):
+                del self._urls[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def missing(self, items: Iterable[Meta]) -> list:
+        """Return the items without a usable url, without counting lookups.
+
+        Args:
+            items: Documents to check.
+        """
+
+        missing = []
+        with self._lock:
+            for item in items:
+                entry = self._urls.get((item.ID, int(item.Version)))
+                if entry is None or self._expired(entry[1]):
+                    missing.append(item)
+        return missing
+
+    def _expired(self, expires: str) -> bool:
+        parsed = parse_datetime(expires)
+        if parsed is None:
+            return False
+        return parsed - timedelta(seconds=self.margin) <= datetime.utcnow()
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of lookups that returned a url."""
+
+        total = self.hits + self.misses
+        if not total:
+            return 0.0
+        return self.hits / total
+
+    def clear(self) -> None:
+        """Forget all urls and reset the statistics."""
+
+        with self._lock:
+            self._urls.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._urls)
+
+
+class MetaCache(object):
+    """An on-disk cache of the meta items listing
+
+    This stores the last listing of the Remarkable Cloud together with the
+    validators the server sent with it (ETag & Last-Modified), so the next
+    listing can be requested conditionally.
+
+    A listing refreshed in the background is only applied when waiting for
+    it with :meth:`wait`, on the waiting thread, so whatever it is applied
+    to never changes while another thread reads it.
+
+    Attributes:
+        path: The location of the cache file.
+        etag: The ETag of the cached listing.
+        last_modified: The Last-Modified date of the cached listing.
+        refresh_thread: The thread running the last background refresh.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """Create a new MetaCache
+
+        Args:
+            path: The location of the cache file. Defaults to
+                ~/.rmapy-meta.json
+        """
+
+        if path is None:
+            path = str(Path.joinpath(Path.home(), ".rmapy-meta.json"))
+        self.path = path
+        self.etag = ""
+        self.last_modified = ""
+        self.refresh_thread: Optional[Thread] = None
+        self._apply: Optional[Callable[[List[dict]], object]] = None
+        self._listing: Optional[List[dict]] = None
+        self._error: Optional[BaseException] = None
+
+    def load(self) -> List[dict]:
+        """Load the cached listing
+
+        Returns:
+            The cached meta items, or an empty list if there is no cache.
+        """
+
+        try:
+            with open(self.path, 'r') as cache_file:
+                data = json.load(cache_file)
+        except (OSError, ValueError):
+            return []
+        self.etag = data.get("etag", "")
+        self.last_modified = data.get("last_modified", "")
+        return data.get("items", [])
+
+    def dump(self, items: List[dict], etag: str = "",
+             last_modified: str = "") -> None:
+        """Replace the cached listing
+
+        The file is written next to the cache & moved in place, so a reader
+        never sees a partially written cache.
+
+        Args:
+            items: The meta items of the listing.
+            etag: The ETag the server sent with the listing.
+            last_modified: The Last-Modified date the server sent with the
+                listing.
+        """
+
+        self.etag = etag
+        self.last_modified = last_modified
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as cache_file:
+            json.dump({
+                "etag": etag,
+                "last_modified": last_modified,
+                "items": items
+            }, cache_file)
+        os.replace(tmp, self.path)
+
+    def headers(self) -> Dict[str, str]:
+        """The headers for a conditional request of the listing."""
+
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def refresh_in_background(self, fetch: Callable[[], Optional[List[dict]]],
+                              apply: Callable[[List[dict]], object]) -> None:
+        """Fetch a new listing in a background thread.
+
+        Args:
+            fetch: Requests the listing, returns None if it did not change.
+            apply: Applies a new listing, called by :meth:`wait`.
+        """
+
+        def run() -> None:
+            try:
+                self._listing = fetch()
+            except Exception as e:
+                self._error = e
+
+        self._apply = apply
+        self._listing = None
+        self._error = None
+        self.refresh_thread = Thread(target=run, daemon=True)
+        self.refresh_thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for a running background refresh to finish & apply it.
+
+        Args:
+            timeout: The maximum number of seconds to wait.
+        Returns:
+            True if a new listing was applied, False if the listing did not
+            change, there was no refresh or it is still running after
+            timeout seconds.
+        Raises:
+            Exception: The exception of the background refresh, like an
+                ApiError or a connection error.
+        """
+
+        thread = self.refresh_thread
+        if thread is None:
+            return False
+        thread.join(timeout)
+        if thread.is_alive():
+            return False
+        self.refresh_thread = None
+        apply, listing, error = self._apply, self._listing, self._error
+        self._apply = self._listing = self._error = None
+        if error is not None:
+            raise error
+        if listing is None or apply is None:
+            return False
+        apply(listing)
+        return True
+
+
+class BlobStore(object):
+    """An on-disk store of downloaded zipfiles
+
+    Zipfiles are stored by the sha256 of their content and looked up by the
+    (ID, Version) of the document, so an unchanged document is never
+    downloaded twice. Identical zipfiles are only stored once. When the
+    store grows over max_size bytes, the least recently used zipfiles are
+    removed, except for the one just stored.
+
+    Attributes:
+        directory: The directory of the store.
+        max_size: The maximum size of all stored zipfiles together.
+        hits: The number of lookups that found a zipfile.
+        misses: The number of lookups that did not.
+    """
+
+    def __init__(self, directory: Optional[str] = None,
+                 max_size: int = BLOB_STORE_SIZE):
+        """Create a new BlobStore
+
+        Args:
+            directory: The directory of the store. Defaults to
+                ~/.rmapy-blobs
+            max_size: The maximum size of all stored zipfiles together.
+        """
+
+        if directory is None:
+            directory = str(Path.joinpath(Path.home(), ".rmapy-blobs"))
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._index_path = os.path.join(directory, "index.json")
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(self._index_path, 'r') as index_file:
+                self._index: Dict[str, dict] = json.load(index_file)
+        except (OSError, ValueError):
+            self._index = {}
+
+    @staticmethod
+    def _key(_id: str, version: int) -> str:
+        return f"{_id}:{int(version)}"
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}.zip")
+
+    def get(self, _id: str, version: int) -> Optional[str]:
+        """Look up the zipfile of a document version
+
+        Args:
+            _id: The ID of the document.
+            version: The version of the document.
+        Returns:
+            The location of the zipfile, or None.
+        """
+
+        with self._lock:
+            entry = self._index.get(self._key(_id, version))
+            if entry is not None and not os.path.exists(
+                    self._path(entry["hash"])):
+                del self._index[self._key(_id, version)]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry["used"] = time()
+            return self._path(entry["hash"])
+
+    def put(self, _id: str, version: int, file: str,
+            move: bool = False) -> str:
+        """Store the zipfile of a document version
+
+        Args:
+            _id: The ID of the document.
+            version: The version of the document.
+            file: The location of the zipfile. It is copied into the store.
+            move: Move the file into the store instead of copying it.
+        Returns:
+            The location of the zipfile in the store.
+        """
+
+        sha = hashlib.sha256()
+        with open(file, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        path = self._path(digest)
+
+        with self._lock:
+            if os.path.exists(path):
+                if move:
+                    os.remove(file)
+            elif move:
+                shutil.move(file, path)
+            else:
+                tmp = f"{path}.tmp"
+                shutil.copyfile(file, tmp)
+                os.replace(tmp, path)
+            self._index[self._key(_id, version)] = {
+                "hash": digest,
+                "size": os.path.getsize(path),
+                "used": time()
+            }
+            self._evict(keep=digest)
+            self._save()
+        return path
+
+    @property
+    def size(self) -> int:
+        """The size of all stored zipfiles together."""
+
+        sizes = {e["hash"]: e["size"] for e in self._index.values()}
+        return sum(sizes.values())
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        """Remove the least recently used zipfiles until under max_size.
+
+        Args:
+            keep: The hash of a zipfile to never remove, the one just
+                stored. A zipfile bigger than max_size stays until the next
+                one is stored.
+        """
+
+        by_hash: Dict[str, dict] = {}
+        for key, entry in self._index.items():
+            blob = by_hash.setdefault(entry["hash"], {
+                "size": entry["size"], "used": 0, "keys": []})
+            blob["used"] = max(blob["used"], entry["used"])
+            blob["keys"].append(key)
+
+        size = sum(b["size"] for b in by_hash.values())
+        for digest, blob in sorted(by_hash.items(),
+                                   key=lambda b: b[1]["used"]):
+            if size <= self.max_size:
+                break
+            if digest == keep:
+                continue
+            for key in blob["keys"]:
+                del self._index[key]
+            try:
+                os.remove(self._path(digest))
+            except OSError:
+                pass
+            size -= blob["size"]
+
+    def _save(self) -> None:
+        tmp = f"{self._index_path}.tmp"
+        with open(tmp, 'w') as index_file:
+            json.dump(self._index, index_file)
+        os.replace(tmp, self._index_path)
+
+    def __len__(self) -> int:
+        return len(self._index)
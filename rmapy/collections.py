@@ -1,25 +1,312 @@
+from bisect import bisect_left, insort
+from fnmatch import fnmatchcase
 from .document import Document
 from .folder import Folder
-from typing import NoReturn, List, Union
+from typing import (NoReturn, List, Union, Tuple, Dict, Optional, Iterator,
+                    TYPE_CHECKING)
 from .exceptions import FolderNotFound
+from .meta import timestamp_key
+from .query import Query
+from .snapshot import Snapshot, write_snapshot
+
+if TYPE_CHECKING:
+    from .cache import MetaCache
 
 DocumentOrFolder = Union[Document, Folder]
 
+# The secondary indexes, in the order of Collection._key after Parent.
+INDEX_FIELDS = ("VissibleName", "Type", "Bookmarked", "ModifiedClient")
+# The attributes set up by hydrating a collection loaded from a snapshot.
+HYDRATED = ("items", "_by_id", "_by_parent", "_names", "_keys", "_paths",
+            "_indexes", "_modified")
+
 
 class Collection(object):
     """A collection of meta items
 
     This is basically the content of the Remarkable Cloud.
 
+    The items are indexed by ID, by Parent and by name within their
+    parent, so looking up an item, its parent, its children or its path does
+    not scan the whole collection. Secondary indexes for queries can be added
+    with :meth:`create_index`. When an indexed attribute of an item is
+    changed, call :meth:`reindex` to update the indexes.
+
+    A collection loaded with :meth:`load_snapshot` is hydrated lazily:
+    :meth:`get`, len() & indexing read single items from the snapshot, and
+    only the first use of anything else, like iterating, builds all items &
+    indexes.
+
     Attributes:
         items: A list containing the items.
+        refresh: The MetaCache of a background refresh started by
+            :meth:`rmapy.api.Client.get_cached_meta_items`. Call its
+            :meth:`rmapy.cache.MetaCache.wait` to apply the refresh.
     """
 
+    refresh: Optional["MetaCache"] = None
+
     def __init__(self, *items: List[DocumentOrFolder]):
+        self._snapshot: Optional[Snapshot] = None
         self.items: List[DocumentOrFolder] = []
+        self._by_id: Dict[str, DocumentOrFolder] = {}
+        self._by_parent: Dict[str, List[DocumentOrFolder]] = {}
+        self._names: Dict[str, Dict[str, List[DocumentOrFolder]]] = {}
+        self._keys: Dict[str, Tuple] = {}
+        self._paths: Dict[str, str] = {}
+        self._indexes: Dict[str, Dict[object,
+                                      Dict[str, DocumentOrFolder]]] = {}
+        self._modified: Optional[List[Tuple[str, str,
+                                            DocumentOrFolder]]] = None
 
         for i in items:
-            self.items.append(i)
+            self._append(i)
+
+    @classmethod
+    def load_snapshot(cls, path: str) -> "Collection":
+        """Load a collection from a snapshot
+
+        Only the snapshot is mapped in memory, Documents & Folders are created
+        when they are accessed.
+
+        Args:
+            path: The location of a snapshot written with
+                :meth:`save_snapshot`.
+        Returns:
+            A lazily hydrated collection.
+        Raises:
+            ValueError: When the file is not a snapshot of this machine.
+        """
+
+        collection = cls.__new__(cls)
+        collection._snapshot = Snapshot(path)
+        return collection
+
+    def save_snapshot(self, path: str) -> None:
+        """Save the items of the collection to a snapshot
+
+        Args:
+            path: The location of the snapshot.
+        """
+
+        write_snapshot(path, self.items)
+
+    def __getattr__(self, name: str):
+        # Only called for missing attributes, which are the indexes of a
+        # collection loaded from a snapshot that is not hydrated yet.
+        if name in HYDRATED and self.__dict__.get("_snapshot") is not None:
+            self._hydrate()
+            return getattr(self, name)
+        raise AttributeError(name)
+
+    def _hydrate(self) -> None:
+        snapshot = self._snapshot
+        Collection.__init__(self, *snapshot.items())
+        snapshot.close()
+
+    @staticmethod
+    def _key(item: DocumentOrFolder) -> Tuple:
+        return (item.Parent, item.VissibleName, item.Type, item.Bookmarked,
+                item.ModifiedClient)
+
+    @staticmethod
+    def _index_value(field: str, key: Tuple) -> object:
+        value = key[INDEX_FIELDS.index(field) + 1]
+        if field == "VissibleName":
+            return value.casefold()
+        if field == "ModifiedClient":
+            return timestamp_key(value)
+        return value
+
+    def _append(self, item: DocumentOrFolder) -> None:
+        self.items.append(item)
+        self._index(item)
+
+    def _index(self, item: DocumentOrFolder) -> None:
+        key = self._key(item)
+        self._keys[item.ID] = key
+        self._by_id[item.ID] = item
+        self._by_parent.setdefault(item.Parent, []).append(item)
+        names = self._names.setdefault(item.Parent, {})
+        names.setdefault(item.VissibleName, []).append(item)
+        for field, index in self._indexes.items():
+            value = self._index_value(field, key)
+            index.setdefault(value, {})[item.ID] = item
+            if field == "ModifiedClient":
+                insort(self._modified, (value, item.ID, item))
+
+    def _unindex(self, item: DocumentOrFolder,
+                 forget_paths: bool = True) -> None:
+        self._by_id.pop(item.ID, None)
+        key = self._keys.pop(item.ID, None)
+        if key is None:
+            return
+        parent, name = key[0], key[1]
+        siblings = self._by_parent.get(parent)
+        if siblings is not None:
+            siblings[:] = [i for i in siblings if i is not item]
+            if not siblings:
+                del self._by_parent[parent]
+        names = self._names.get(parent, {})
+        same_name = names.get(name)
+        if same_name is not None:
+            same_name[:] = [i for i in same_name if i is not item]
+            if not same_name:
+                del names[name]
+        for field, index in self._indexes.items():
+            value = self._index_value(field, key)
+            matches = index.get(value, {})
+            matches.pop(item.ID, None)
+            if not matches:
+                index.pop(value, None)
+            if field == "ModifiedClient":
+                pos = bisect_left(self._modified, (value, item.ID))
+                if (pos < len(self._modified)
+                        and self._modified[pos][1] == item.ID):
+                    del self._modified[pos]
+        if forget_paths:
+            self._forget_paths(item)
+
+    def _forget_paths(self, item: DocumentOrFolder) -> None:
+        """Drop the cached paths of an item and everything below it."""
+
+        if self._paths.pop(item.ID, None) is None:
+            return
+        if isinstance(item, Folder):
+            for child in self.walk(item):
+                self._paths.pop(child.ID, None)
+
+    def reindex(self, item: DocumentOrFolder) -> None:
+        """Update the indexes after an indexed attribute of an item changed.
+
+        The indexed attributes are Parent, VissibleName, Type, Bookmarked &
+        ModifiedClient.
+
+        Args:
+            item: An item of this collection.
+        """
+
+        old = self._keys.get(item.ID)
+        key = self._key(item)
+        if old != key:
+            moved = old is None or old[:2] != key[:2]
+            self._unindex(item, forget_paths=moved)
+            self._index(item)
+
+    def create_index(self, *fields: str) -> None:
+        """Add secondary indexes used by :meth:`query`
+
+        Args:
+            fields: Any of Type, Bookmarked, ModifiedClient & VissibleName.
+                The VissibleName index is case-folded. Parent is always
+                indexed.
+        Raises:
+            ValueError: When a field cannot be indexed.
+        """
+
+        for field in fields:
+            if field == "Parent":
+                continue
+            if field not in INDEX_FIELDS:
+                raise ValueError(f"Cannot index {field}")
+            if field in self._indexes:
+                continue
+            index: Dict[object, Dict[str, DocumentOrFolder]] = {}
+            for item in self.items:
+                value = self._index_value(field, self._keys[item.ID])
+                index.setdefault(value, {})[item.ID] = item
+            if field == "ModifiedClient":
+                # IDs are unique, so the items are never compared.
+                self._modified = sorted(
+                    (value, _id, i) for value, matches in index.items()
+                    for _id, i in matches.items())
+            self._indexes[field] = index
+
+    def drop_index(self, field: str) -> None:
+        """Remove a secondary index
+
+        Args:
+            field: The indexed field.
+        """
+
+        self._indexes.pop(field, None)
+        if field == "ModifiedClient":
+            self._modified = None
+
+    def _lookup(self, field: str, value: object
+                ) -> Optional[Dict[str, DocumentOrFolder]]:
+        """Look up the items with a value in an index.
+
+        Returns:
+            A dict mapping the ID to the item, or None when the field is not
+            indexed. The VissibleName index matches case-insensitively, and
+            the ModifiedClient index any timestamp of the same moment.
+        """
+
+        if field == "Parent":
+            return {i.ID: i for i in self._by_parent.get(value, [])}
+        index = self._indexes.get(field)
+        if index is None:
+            return None
+        if field == "VissibleName":
+            value = value.casefold()
+        elif field == "ModifiedClient":
+            if not isinstance(value, str):
+                return None
+            value = timestamp_key(value)
+        return index.get(value, {})
+
+    def _lookup_names(self, pattern: str
+                      ) -> Optional[Dict[str, DocumentOrFolder]]:
+        """Look up the items with a case-folded name matching a pattern."""
+
+        index = self._indexes.get("VissibleName")
+        if index is None:
+            return None
+        pattern = pattern.casefold()
+        found: Dict[str, DocumentOrFolder] = {}
+        for name, matches in index.items():
+            if fnmatchcase(name, pattern):
+                found.update(matches)
+        return found
+
+    def _lookup_modified(self, since: Optional[str] = None,
+                         before: Optional[str] = None
+                         ) -> Optional[List[DocumentOrFolder]]:
+        """Look up the items modified in a range, oldest first.
+
+        Args:
+            since: The :func:`rmapy.meta.timestamp_key` to start at.
+            before: The :func:`rmapy.meta.timestamp_key` to end before.
+        """
+
+        if self._modified is None:
+            return None
+        start = 0
+        end = len(self._modified)
+        if since is not None:
+            start = bisect_left(self._modified, (since, ""))
+        if before is not None:
+            end = bisect_left(self._modified, (before, ""))
+        return [entry[2] for entry in self._modified[start:end]]
+
+    def _iter_modified(self, reverse: bool = False
+                       ) -> Optional[Iterator[DocumentOrFolder]]:
+        """Iterate over all items by modification date."""
+
+        if self._modified is None:
+            return None
+        entries = reversed(self._modified) if reverse else self._modified
+        return (entry[2] for entry in entries)
+
+    def query(self) -> "Query":
+        """Start a query over this collection
+
+        Returns:
+            A :class:`rmapy.query.Query` matching every item.
+        """
+
+        return Query(self)
 
     def add(self, doc_dict: dict) -> None:
         """Add an item to the collection.
@@ -45,7 +332,7 @@ class Collection(object):
             doc_dict: A dict representing a document.
         """
 
-        self.items.append(Document(**doc_dict))
+        self._append(Document(**doc_dict))
 
     def add_folder(self, dir_dict: dict) -> None:
         """Add a document to the collection
@@ -54,7 +341,60 @@ class Collection(object):
             dir_dict: A dict representing a folder.
         """
 
-        self.items.append(Folder(**dir_dict))
+        self._append(Folder(**dir_dict))
+
+    def update(self, doc_dicts: List[dict]
+               ) -> Tuple[List[DocumentOrFolder], List[DocumentOrFolder],
+                          List[DocumentOrFolder]]:
+        """Update the collection in place from a new listing.
+
+        Items that are still listed keep their instance, with the attributes
+        updated when their version changed.
+
+        Args:
+            doc_dicts: A list of dicts representing all documents & folders.
+        Returns:
+            A tuple of the added, changed & removed items.
+        """
+
+        current = {i.ID: i for i in self.items}
+        added: List[DocumentOrFolder] = []
+        changed: List[DocumentOrFolder] = []
+        for doc_dict in doc_dicts:
+            item = current.pop(doc_dict.get("ID"), None)
+            if item is None:
+                self.add(doc_dict)
+                added.append(self.items[-1])
+            elif (item.Version != doc_dict.get("Version", item.Version)
+                  or item.Parent != doc_dict.get("Parent", item.Parent)
+                  or item.VissibleName != doc_dict.get("VissibleName",
+                                                       item.VissibleName)):
+                for k in item.to_dict().keys():
+                    if k in doc_dict and k != "Type":
+                        setattr(item, k, doc_dict[k])
+                self.reindex(item)
+                changed.append(item)
+
+        removed = list(current.values())
+        if removed:
+            gone = set(current.keys())
+            self.items = [i for i in self.items if i.ID not in gone]
+            for item in removed:
+                self._unindex(item)
+        return added, changed, removed
+
+    def get(self, _id: str) -> Optional[DocumentOrFolder]:
+        """Get an item by ID
+
+        Args:
+            _id: The ID of the item.
+        Returns:
+            The item, or None if it is not in the collection.
+        """
+
+        if self._snapshot is not None:
+            return self._snapshot.get(_id)
+        return self._by_id.get(_id)
 
     def parent(self, doc_or_folder: DocumentOrFolder) -> Folder:
         """Returns the paren of a Document or Folder
@@ -66,9 +406,9 @@ class Collection(object):
             The parent folder.
         """
 
-        results = [i for i in self.items if i.ID == doc_or_folder.ID]
-        if len(results) > 0 and isinstance(results[0], Folder):
-            return results[0]
+        result = self._by_id.get(doc_or_folder.Parent)
+        if isinstance(result, Folder):
+            return result
         else:
             raise FolderNotFound("Could not found the parent of the document.")
 
@@ -83,12 +423,143 @@ class Collection(object):
         """
 
         if folder:
-            return [i for i in self.items if i.Parent == folder.ID]
+            return list(self._by_parent.get(folder.ID, []))
         else:
-            return [i for i in self.items if i.Parent == ""]
+            return list(self._by_parent.get("", []))
+
+    def walk(self, folder: Folder = None) -> Iterator[DocumentOrFolder]:
+        """Iterate over everything in a folder and its subfolders
+
+        Every folder is yielded before its children.
+
+        Args:
+            folder: The folder to walk. If None, this walks from the root.
+        Yields:
+            The documents & folders in the folder tree.
+        """
+
+        stack = list(reversed(self.children(folder)))
+        while stack:
+            item = stack.pop()
+            yield item
+            if isinstance(item, Folder):
+                stack.extend(reversed(self._by_parent.get(item.ID, [])))
+
+    def ancestors(self, doc_or_folder: DocumentOrFolder) -> List[Folder]:
+        """Get the folders a Document or Folder is in
+
+        Args:
+            doc_or_folder: A document or folder to get the ancestors from.
+        Returns:
+            The folders from the direct parent up to the top folder. Empty
+            for an item in the root.
+        """
+
+        ancestors: List[Folder] = []
+        seen = {doc_or_folder.ID}
+        parent = self._by_id.get(doc_or_folder.Parent)
+        while isinstance(parent, Folder) and parent.ID not in seen:
+            ancestors.append(parent)
+            seen.add(parent.ID)
+            parent = self._by_id.get(parent.Parent)
+        return ancestors
+
+    def path_of(self, doc_or_folder: DocumentOrFolder) -> str:
+        """Get the path of a Document or Folder
+
+        Args:
+            doc_or_folder: A document or folder of this collection.
+        Returns:
+            The path from the root, like /Work/Reports/Q3.
+        """
+
+        path = self._paths.get(doc_or_folder.ID)
+        if path is None:
+            parent = self._by_id.get(doc_or_folder.Parent)
+            if isinstance(parent, Folder) and parent is not doc_or_folder:
+                prefix = self.path_of(parent)
+            else:
+                prefix = ""
+            path = f"{prefix}/{doc_or_folder.VissibleName}"
+            self._paths[doc_or_folder.ID] = path
+        return path
+
+    def find_by_path(self, path: str) -> Optional[DocumentOrFolder]:
+        """Get an item by its path
+
+        When more than one item has the same path, the first one added is
+        returned.
+
+        Args:
+            path: A path from the root, like /Work/Reports/Q3.
+        Returns:
+            The item, or None if there is nothing at that path.
+        """
+
+        item = None
+        parent = ""
+        for name in path.strip("/").split("/"):
+            items = self._names.get(parent, {}).get(name)
+            if not items:
+                return None
+            item = items[0]
+            parent = item.ID
+        return item
+
+    def glob(self, pattern: str) -> List[DocumentOrFolder]:
+        """Get all items with a path matching a pattern
+
+        Every part of the pattern is matched with :func:`fnmatch.fnmatchcase`
+        against the names in one folder. A part of ** matches any number of
+        folders.
+
+        Args:
+            pattern: A pattern like /Work/*/Q? or /**/*.pdf
+        Returns:
+            The matching items.
+        """
+
+        parts = pattern.strip("/").split("/")
+        results: List[DocumentOrFolder] = []
+        seen = set()
+
+        def match(parent: str, i: int) -> None:
+            if (parent, i) in seen:
+                return
+            seen.add((parent, i))
+            if i == len(parts):
+                item = self._by_id.get(parent)
+                if item is not None:
+                    results.append(item)
+                return
+            part = parts[i]
+            names = self._names.get(parent, {})
+            if part == "**":
+                match(parent, i + 1)
+                for child in self._by_parent.get(parent, []):
+                    if isinstance(child, Folder):
+                        match(child.ID, i)
+                return
+            if any(c in part for c in "*?["):
+                matches = [n for n in names if fnmatchcase(n, part)]
+            else:
+                matches = [part] if part in names else []
+            for name in matches:
+                for item in names[name]:
+                    match(item.ID, i + 1)
+
+        match("", 0)
+        return results
 
     def __len__(self) -> int:
+        if self._snapshot is not None:
+            return len(self._snapshot)
         return len(self.items)
 
     def __getitem__(self, position: int) -> DocumentOrFolder:
+        if self._snapshot is not None and isinstance(position, int):
+            return self._snapshot.item(position)
         return self.items[position]
+
+    def __iter__(self) -> Iterator[DocumentOrFolder]:
+        return iter(self.items)
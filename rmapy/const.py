@@ -6,3 +6,15 @@ DEVICE_TOKEN_URL = AUTH_BASE_URL + "/token/json/2/device/new"
 USER_TOKEN_URL = AUTH_BASE_URL + "/token/json/2/user/new"
 DEVICE = "desktop-windows"
 SERVICE_MGR_URL = "https://service-manager-production-dot-remarkable-production.appspot.com"  # noqa
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 10
+BATCH_SIZE = 100
+CHUNK_SIZE = 64 * 1024
+SPOOL_SIZE = 8 * 1024 * 1024
+MAX_INFLIGHT_BYTES = 256 * 1024 * 1024
+BLOB_URL_MARGIN = 60
+BLOB_STORE_SIZE = 4 * 1024 * 1024 * 1024
+WATCH_MIN_INTERVAL = 5
+WATCH_MAX_INTERVAL = 300
+STORED_EXTENSIONS = (".pdf", ".epub", ".jpg", ".jpeg", ".png")
+PARALLEL_PAGES = 16
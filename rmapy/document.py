@@ -1,16 +1,107 @@
 import os
+import mmap
+import time
+import zlib
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
-from zipfile import ZipFile, ZIP_DEFLATED
+from zipfile import (ZipFile, ZipInfo, BadZipFile, ZIP_DEFLATED, ZIP_STORED,
+                     ZIP64_LIMIT)
 import shutil
+from tempfile import SpooledTemporaryFile
 from uuid import uuid4
 import json
-from typing import TypeVar, List, Tuple
+from typing import (TypeVar, List, Tuple, Union, IO, Optional, Iterable,
+                    Iterator)
 from logging import getLogger
 from requests import Response
 from .meta import Meta
+from .lines import Lines, load as load_lines
+from .const import (CHUNK_SIZE, SPOOL_SIZE, STORED_EXTENSIONS,
+                    PARALLEL_PAGES)
 
 log = getLogger("rmapy")
+# The size of the fixed part of a local file header in a zipfile.
+HEADER_SIZE = 30
 BytesOrString = TypeVar("BytesOrString", BytesIO, str)
+FileOrPath = Union[str, os.PathLike, IO[bytes]]
+
+
+class ZipMember(object):
+    """A read-only file object for a member of an open zipfile
+
+    The member is only opened when it is first read, so creating a view
+    costs no I/O. Seeking back to the start closes the member again,
+    dropping its buffers until it is read again.
+
+    Attributes:
+        name: The name of the member in the zipfile.
+        size: The uncompressed size of the member.
+    """
+
+    def __init__(self, zf: ZipFile, name: str,
+                 mapping: Optional[mmap.mmap] = None):
+        self.name = name
+        self._info: ZipInfo = zf.getinfo(name)
+        self.size = self._info.file_size
+        self._zf = zf
+        self._mapping = mapping
+        self._fp: Optional[IO[bytes]] = None
+
+    def read(self, size: int = -1) -> bytes:
+        if self._fp is None:
+            self._fp = self._zf.open(self.name, 'r')
+        return self._fp.read(size)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        if offset == 0 and whence == 0:
+            self.close()
+            return 0
+        if self._fp is None:
+            self._fp = self._zf.open(self.name, 'r')
+        return self._fp.seek(offset, whence)
+
+    def tell(self) -> int:
+        if self._fp is None:
+            return 0
+        return self._fp.tell()
+
+    def getvalue(self) -> bytes:
+        """Read the whole member, like :meth:`io.BytesIO.getvalue`."""
+
+        with self._zf.open(self.name, 'r') as fp:
+            return fp.read()
+
+    def view(self) -> memoryview:
+        """Get the content of the member as a memoryview.
+
+        A stored member of a memory mapped zipfile is a slice of the
+        mapping, so nothing is copied & the CRC is not checked. Other
+        members are decompressed.
+        """
+
+        info = self._info
+        if (self._mapping is not None and info.compress_type == ZIP_STORED
+                and not info.flag_bits & 0x1):
+            offset = info.header_offset
+            start = _data_offset(info,
+                                 self._mapping[offset:offset + HEADER_SIZE])
+            if start is not None:
+                return memoryview(self._mapping)[
+                    start:start + info.compress_size]
+        return memoryview(self.getvalue())
+
+    def close(self) -> None:
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    def __str__(self) -> str:
+        return f"<rmapy.document.ZipMember {self.name}>"
+
+    def __repr__(self) -> str:
+        return self.__str__()
 
 
 class RmPage(object):
@@ -18,6 +109,9 @@ class RmPage(object):
 
     Contains the metadata, the page itself & thumbnail.
 
+    The page & thumbnail of a lazily loaded zipfile are
+    :class:`ZipMember` views, and the metadata is read when first used.
+
     """
     def __init__(self, page, metadata=None, order=0, thumbnail=None, _id=None):
         self.page = page
@@ -34,6 +128,24 @@ class RmPage(object):
         else:
             self.ID = str(uuid4())
 
+    @property
+    def metadata(self) -> dict:
+        if isinstance(self._metadata, ZipMember):
+            self._metadata = json.loads(self._metadata.getvalue())
+        return self._metadata
+
+    @metadata.setter
+    def metadata(self, value: Union[dict, ZipMember]) -> None:
+        self._metadata = value
+
+    def lines(self) -> Lines:
+        """Parse the strokes of this page, this needs numpy.
+
+        See :func:`rmapy.lines.parse`.
+        """
+
+        return load_lines(self.page)
+
     def __str__(self) -> str:
         """String representation of this object"""
         return f"<rmapy.document.RmPage {self.order} for {self.ID}>"
@@ -56,11 +168,27 @@ class Highlight(object):
         Attributes:
             page_id: The ID of the page where the highlight is located.
             highlight_data: A dictionary containing all highlight data.
+                For a lazily loaded zipfile, it is read when first used.
     """
 
-    def __init__(self, page_id: str, highlight_data: str):
+    def __init__(self, page_id: str,
+                 highlight_data: Union[str, bytes, ZipMember]):
         self.page_id = page_id
-        self.highlight_data = json.loads(highlight_data)
+        if isinstance(highlight_data, ZipMember):
+            self._highlight_data = highlight_data
+        else:
+            self._highlight_data = json.loads(highlight_data)
+
+    @property
+    def highlight_data(self) -> dict:
+        if isinstance(self._highlight_data, ZipMember):
+            self._highlight_data = json.loads(
+                self._highlight_data.getvalue())
+        return self._highlight_data
+
+    @highlight_data.setter
+    def highlight_data(self, value: dict) -> None:
+        self._highlight_data = value
 
     def __str__(self) -> str:
         """String representation of this object"""
@@ -95,6 +223,8 @@ class Document(Meta):
 
     """
 
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super(Document, self).__init__(**kwargs)
         self.Type = "DocumentType"
@@ -137,18 +267,28 @@ class ZipDocument(object):
         highlights: list of contents of the .highlights folder
         pagedata: the content of the .pagedata file.
         zipfile: The raw zipfile in memory.
-        pdf: the raw pdf file if there is one.
-        epub: the raw epub file if there is one.
+        pdf: the raw pdf file if there is one, as a file location or a file
+            object.
+        epub: the raw epub file if there is one, as a file location or a
+            file object.
         rm: A list of :class:rmapy.document.RmPage in this zip.
 
     """
-    def __init__(self, _id=None, doc=None, file=None):
+    def __init__(self, _id=None, doc=None, file=None, file_type=None,
+                 lazy=False):
         """Create a new instance of a ZipDocument
 
+        A pdf or epub is not read into memory, but streamed from its file
+        when dumping the zipfile. A file location is only opened while
+        dumping, so creating many documents does not keep files open.
+
         Args:
             _id: Can be left empty to generate one
-            doc: a raw pdf, epub or rm (.lines) file.
+            doc: a raw pdf, epub or rm (.lines) file location or file object.
             file: a zipfile to convert from
+            file_type: pdf, epub or rm. Can be left empty if doc is a file
+                location or has a name ending in the extension.
+            lazy: Load the zipfile lazily, see :meth:`load`.
         """
         # {"extraMetadata": {},
         # "fileType": "pdf",
@@ -218,33 +358,67 @@ class ZipDocument(object):
         self.ID = None
 
         self.highlights: List[Highlight] = []
+        self._zf: Optional[ZipFile] = None
+        self._mapping: Optional[mmap.mmap] = None
+        self._source: Optional[FileOrPath] = None
 
         if not _id:
             _id = str(uuid4())
         self.ID = _id
         if doc:
-            ext = doc[-4:]
+            if isinstance(doc, (str, os.PathLike)):
+                path = os.fspath(doc)
+                fb = None
+            else:
+                path = getattr(doc, "name", "")
+                if not isinstance(path, str):
+                    path = ""
+                fb = doc
+            ext = file_type or path[-4:]
             if ext.endswith("pdf"):
                 self.content["fileType"] = "pdf"
-                self.pdf = BytesIO()
-                with open(doc, 'rb') as fb:
-                    self.pdf.write(fb.read())
-                self.pdf.seek(0)
+                self.pdf = fb or path
             if ext.endswith("epub"):
                 self.content["fileType"] = "epub"
-                self.epub = BytesIO()
-                with open(doc, 'rb') as fb:
-                    self.epub.write(fb.read())
-                self.epub.seek(0)
+                self.epub = fb or path
             elif ext.endswith("rm"):
                 self.content["fileType"] = "notebook"
-                with open(doc, 'rb') as fb:
+                if fb:
                     self.rm.append(RmPage(page=BytesIO(fb.read())))
-            name = os.path.splitext(os.path.basename(doc))[0]
-            self.metadata["VissibleName"] = name
+                else:
+                    with open(path, 'rb') as fb:
+                        self.rm.append(RmPage(page=BytesIO(fb.read())))
+            if path:
+                name = os.path.splitext(os.path.basename(path))[0]
+                self.metadata["VissibleName"] = name
 
         if file:
-            self.load(file)
+            self.load(file, lazy=lazy)
+
+    def __enter__(self) -> "ZipDocument":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the pdf or epub file this document was created from, or the
+        zipfile it was lazily loaded from."""
+
+        for f in (self.pdf, self.epub):
+            if f is not None and not isinstance(f, (str, BytesIO)):
+                f.close()
+        if self._zf is not None:
+            self._zf.close()
+            self._zf = None
+        if self._mapping is not None:
+            try:
+                self._mapping.close()
+            except BufferError:
+                # Views of stored members are still in use, the mapping is
+                # closed when the last one is released.
+                pass
+            self._mapping = None
 
     def __str__(self) -> str:
         """string representation of this class"""
@@ -261,150 +435,533 @@ class ZipDocument(object):
             "Version": self.metadata["version"]
         }
 
-    def dump(self, file: BytesOrString) -> None:
+    def dump(self, file: BytesOrString, compresslevel: Optional[int] = None,
+             workers: Optional[int] = None, repack: bool = True) -> None:
         """Dump the contents of ZipDocument back to a zip file.
 
         This builds a zipfile to upload back to the Remarkable Cloud.
+        The pdf, epub, pages & thumbnails are copied in chunks, so they are
+        never held in memory as a whole.
+
+        Members that are already compressed, like the pdf, epub &
+        thumbnails, are stored as is. The pages of a notebook with
+        PARALLEL_PAGES pages or more are compressed by a pool of threads.
+
+        When the document was loaded from a zipfile, the pdf, epub, pages &
+        thumbnails that did not change are copied from it as they are,
+        without decompressing & compressing them again. A member did not
+        change when it is still a :class:`ZipMember` of a lazy load, or
+        when its content has the size & CRC of the member with the same
+        name in the loaded zipfile.
+
+        Dumping to the file location or file object the document was loaded
+        from replaces its content once the new zipfile is complete. A lazily
+        loaded document is then loaded again.
 
         Args:
             file: Where to save the zipfile
+            compresslevel: The zlib compression level of the other members,
+                from 0 to 9. Defaults to the zlib default.
+            workers: The number of threads compressing pages. Defaults to
+                the number of CPUs, 1 compresses the pages one by one.
+            repack: Copy unchanged members from the loaded zipfile.
 
         """
-        with ZipFile(file, "w", ZIP_DEFLATED) as zf:
-            zf.writestr(f"{self.ID}.content",
-                        json.dumps(self.content))
-            zf.writestr(f"{self.ID}.pagedata",
-                        self.pagedata)
-
-            if self.pdf:
-                zf.writestr(f"{self.ID}.pdf",
-                            self.pdf.read())
-
-            if self.epub:
-                zf.writestr(f"{self.ID}.epub",
-                            self.epub.read())
-
-            for highlight in self.highlights:
-                zf.writestr(f"{self.ID}.highlights/{highlight.page_id}.json",
-                            json.dumps(highlight.highlight_data))
-
-            for page in self.rm:
-
-                zf.writestr(f"{self.ID}/{page.order}.rm",
-                            page.page.read())
-
-                zf.writestr(f"{self.ID}/{page.order}-metadata.json",
-                            json.dumps(page.metadata))
-                page.page.seek(0)
-                try:
-                    zf.writestr(f"{self.ID}.thumbnails/{page.order}.jpg",
-                                page.thumbnail.read())
-                except AttributeError:
-                    log.debug(f"missing thumbnail during dump: {self.ID}: {page.order}")
-                    pass
+        if compresslevel is None:
+            compresslevel = zlib.Z_DEFAULT_COMPRESSION
+        if workers is None:
+            workers = os.cpu_count() or 1
+        # Members are read from the zipfile this document was loaded from,
+        # so it is only replaced once the new zipfile is complete.
+        in_place = self._is_source(file)
+        if in_place and isinstance(file, (str, os.PathLike)):
+            target = f"{os.fspath(file)}.tmp"
+        elif in_place:
+            target = SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        else:
+            target = file
+        source = self._open_source() if repack else None
+        try:
+            with ZipFile(target, "w", ZIP_DEFLATED,
+                         compresslevel=compresslevel) as zf:
+                self._dump_members(zf, compresslevel, workers, source)
+        except BaseException:
+            if in_place and isinstance(target, str):
+                if os.path.exists(target):
+                    os.remove(target)
+            elif in_place:
+                target.close()
+            raise
+        finally:
+            if source is not None and source is not self._zf:
+                source.close()
+                if not isinstance(self._source, (str, os.PathLike)):
+                    self._source.seek(0)
+        if in_place and isinstance(target, str):
+            self._replace_source(target, file)
+        elif in_place:
+            target.seek(0)
+            file.seek(0)
+            file.truncate()
+            shutil.copyfileobj(target, file, CHUNK_SIZE)
+            target.close()
+            if self._zf is not None:
+                # The lazily loaded members point into the old content.
+                self._reload()
         if isinstance(file, BytesIO):
             file.seek(0)
 
-    def load(self, file: BytesOrString) -> None:
+    def _replace_source(self, target: str, file: FileOrPath) -> None:
+        """Move a dumped zipfile over the file location it was loaded from.
+
+        A file that is open or memory mapped cannot be replaced on Windows,
+        so a lazily loaded zipfile is closed first and loaded again after.
+        """
+
+        lazy = self._zf is not None
+        if lazy:
+            self.close()
+        try:
+            os.replace(target, file)
+        except BaseException:
+            os.remove(target)
+            raise
+        finally:
+            if lazy:
+                self._reload()
+
+    def _is_source(self, file: BytesOrString) -> bool:
+        """Check if a file is the zipfile this document was loaded from."""
+
+        source = self._source
+        if source is None:
+            return False
+        if (isinstance(file, (str, os.PathLike))
+                and isinstance(source, (str, os.PathLike))):
+            try:
+                return os.path.samefile(file, source)
+            except OSError:
+                return False
+        return file is source
+
+    def _reload(self) -> None:
+        """Lazily load the zipfile this document was loaded from again,
+        after it was overwritten."""
+
+        file = self._source
+        self.close()
+        self.pdf = None
+        self.epub = None
+        self.rm = []
+        self.highlights = []
+        self.load(file, lazy=True)
+
+    def _open_source(self) -> Optional[ZipFile]:
+        """Open the zipfile this document was loaded from, if any."""
+
+        if self._zf is not None:
+            return self._zf
+        if self._source is None:
+            return None
+        try:
+            return ZipFile(self._source, 'r')
+        except (OSError, BadZipFile) as e:
+            log.debug(f"cannot repack from the loaded zipfile: {e}")
+            return None
+
+    def _unchanged(self, name: str, fp: IO[bytes],
+                   source: Optional[ZipFile]
+                   ) -> Optional[Tuple[ZipFile, ZipInfo,
+                                       Optional[mmap.mmap]]]:
+        """Find the member of a zipfile a member can be copied from.
+
+        Returns:
+            A tuple of the zipfile, the member & the memory mapping of the
+            zipfile if there is one, or None when the member has to be
+            written again.
+        """
+
+        if isinstance(fp, ZipMember):
+            found = (fp._zf, fp._info, fp._mapping)
+        elif isinstance(fp, BytesIO) and source is not None:
+            info = source.NameToInfo.get(name)
+            if info is None:
+                return None
+            with fp.getbuffer() as data:
+                if (len(data) != info.file_size
+                        or zlib.crc32(data) != info.CRC):
+                    return None
+            found = (source, info, None)
+        else:
+            return None
+        info = found[1]
+        if (info.flag_bits & 0x1
+                or info.compress_type not in (ZIP_STORED, ZIP_DEFLATED)):
+            return None
+        return found
+
+    def _write_member(self, zf: ZipFile, name: str, fp: FileOrPath,
+                      source: Optional[ZipFile]) -> None:
+        found = self._unchanged(name, fp, source) if source else None
+        if found is None:
+            _write_file(zf, name, fp)
+        else:
+            _copy_raw(zf, name, *found)
+
+    def _dump_members(self, zf: ZipFile, compresslevel: int, workers: int,
+                      source: Optional[ZipFile]) -> None:
+        zf.writestr(f"{self.ID}.content",
+                    json.dumps(self.content))
+        zf.writestr(f"{self.ID}.pagedata",
+                    self.pagedata)
+
+        if self.pdf:
+            self._write_member(zf, f"{self.ID}.pdf", self.pdf, source)
+
+        if self.epub:
+            self._write_member(zf, f"{self.ID}.epub", self.epub, source)
+
+        for highlight in self.highlights:
+            zf.writestr(f"{self.ID}.highlights/{highlight.page_id}.json",
+                        json.dumps(highlight.highlight_data))
+
+        if workers > 1 and len(self.rm) >= PARALLEL_PAGES:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                self._dump_pages(zf, compresslevel, source, executor,
+                                 workers)
+        else:
+            self._dump_pages(zf, compresslevel, source)
+
+    def _dump_pages(self, zf: ZipFile, compresslevel: int,
+                    source: Optional[ZipFile],
+                    executor: Optional[ThreadPoolExecutor] = None,
+                    workers: int = 1) -> None:
+        """Write the pages, their metadata & thumbnails.
+
+        With an executor, the pages are deflated in its threads, as zlib
+        releases the GIL, and written in order as they are done. At most
+        two pages per worker are held in memory.
+        """
+
+        pending: deque = deque()
+
+        def write_page(page: RmPage, deflated=None) -> None:
+            name = f"{self.ID}/{page.order}.rm"
+            if deflated is None:
+                self._write_member(zf, name, page.page, source)
+            else:
+                _write_raw(zf, name, *deflated.result())
+
+            zf.writestr(f"{self.ID}/{page.order}-metadata.json",
+                        json.dumps(page.metadata))
+            try:
+                self._write_member(
+                    zf, f"{self.ID}.thumbnails/{page.order}.jpg",
+                    page.thumbnail, source)
+            except AttributeError:
+                log.debug(f"missing thumbnail during dump: {self.ID}: {page.order}")
+                pass
+
+        for page in self.rm:
+            name = f"{self.ID}/{page.order}.rm"
+            if executor is None or (source is not None and self._unchanged(
+                    name, page.page, source) is not None):
+                pending.append((page, None))
+            else:
+                pending.append((page, executor.submit(
+                    _deflate, page.page, compresslevel)))
+            if len(pending) >= 2 * workers:
+                write_page(*pending.popleft())
+        while pending:
+            write_page(*pending.popleft())
+
+    def load(self, file: FileOrPath, lazy: bool = False) -> None:
         """Load a zipfile into this class.
 
-        Extracts the zipfile and reads in the contents.
+        Extracts the zipfile and reads in the contents. A file location is
+        read in place, without copying the zipfile into memory first.
+
+        When loading lazily, only the list of members and the .content,
+        .metadata & .pagedata are read. The pdf, epub, pages & thumbnails
+        are :class:`ZipMember` views that are read when used, and page
+        metadata & highlights are parsed when first accessed. The zipfile
+        stays open until :meth:`close`. A file location is also memory
+        mapped, so :meth:`ZipMember.view` of a stored member, usually the
+        pdf or epub, does not copy it.
 
         Args:
-            file: A string of a file location or a BytesIO instance of a raw
+            file: A file location or a file object (like BytesIO) of a raw
                 zipfile
+            lazy: Read the members of the zipfile when they are used.
         """
 
-        self.zipfile = BytesIO()
-        self.zipfile.seek(0)
-        if isinstance(file, str):
-            with open(file, 'rb') as f:
-                shutil.copyfileobj(f, self.zipfile)
-        elif isinstance(file, BytesIO):
+        if isinstance(file, (str, os.PathLike)):
+            self.zipfile = BytesIO()
+            source = file
+        elif hasattr(file, "read") and hasattr(file, "seek"):
             self.zipfile = file
             self.zipfile.seek(0)
+            source = self.zipfile
         else:
             raise Exception("Unsupported file type.")
-        with ZipFile(self.zipfile, 'r') as zf:
-            with zf.open(f"{self.ID}.content", 'r') as content:
-                self.content = json.load(content)
-            try:
-                with zf.open(f"{self.ID}.metadata", 'r') as metadata:
-                    self.metadata = json.load(metadata)
-            except KeyError:
-                pass
-            try:
-                with zf.open(f"{self.ID}.pagedata", 'r') as pagedata:
-                    self.pagedata = str(pagedata.read())
-            except KeyError:
-                pass
+        zf = ZipFile(source, 'r')
+        mapping = None
+        try:
+            if lazy and isinstance(source, (str, os.PathLike)):
+                with open(file, 'rb') as f:
+                    mapping = mmap.mmap(f.fileno(), 0,
+                                        access=mmap.ACCESS_READ)
+            self._load_members(zf, lazy, mapping)
+        except BaseException:
+            zf.close()
+            if mapping is not None:
+                mapping.close()
+            raise
+        self._source = file
+        if lazy:
+            self._zf = zf
+            self._mapping = mapping
+        else:
+            zf.close()
+            self.zipfile.seek(0)
 
-            try:
-                with zf.open(f"{self.ID}.pdf", 'r') as pdf:
-                    self.pdf = BytesIO(pdf.read())
-            except KeyError:
-                pass
+    def _load_members(self, zf: ZipFile, lazy: bool,
+                      mapping: Optional[mmap.mmap]) -> None:
+        namelist = zf.namelist()
+        names = set(namelist)
+
+        def member(name: str) -> Union[ZipMember, BytesIO, None]:
+            if name not in names:
+                return None
+            if lazy:
+                return ZipMember(zf, name, mapping)
+            with zf.open(name, 'r') as fp:
+                return BytesIO(fp.read())
+
+        with zf.open(f"{self.ID}.content", 'r') as content:
+            self.content = json.load(content)
+        if f"{self.ID}.metadata" in names:
+            with zf.open(f"{self.ID}.metadata", 'r') as metadata:
+                self.metadata = json.load(metadata)
+        if f"{self.ID}.pagedata" in names:
+            with zf.open(f"{self.ID}.pagedata", 'r') as pagedata:
+                self.pagedata = str(pagedata.read())
+
+        pdf = member(f"{self.ID}.pdf")
+        if pdf is not None:
+            self.pdf = pdf
+        epub = member(f"{self.ID}.epub")
+        if epub is not None:
+            self.epub = epub
+
+        # Get Highlights
+        prefix = f"{self.ID}.highlights/"
+        for name in namelist:
+            if name.startswith(prefix) and name.endswith('.json'):
+                page_id = name[len(prefix):-len('.json')]
+                if lazy:
+                    data = ZipMember(zf, name)
+                else:
+                    data = zf.read(name)
+                self.highlights.append(Highlight(page_id, data))
+
+        # Get the RM pages
+        prefix = f"{self.ID}/"
+        for p in namelist:
+            if not (p.startswith(prefix) and p.endswith('.rm')):
+                continue
+            page_number = int(p[len(prefix):-len('.rm')])
+            page = member(p)
+
+            p_meta = p.replace(".rm", "-metadata.json")
+            if p_meta not in names:
+                log.debug(f"missing metadata: {p_meta}")
+                metadata = None
+            elif lazy:
+                metadata = ZipMember(zf, p_meta)
+            else:
+                with zf.open(p_meta, 'r') as md:
+                    metadata = json.load(md)
+            thumbnail_name = p.replace(".rm", ".jpg")
+            thumbnail_name = thumbnail_name.replace("/", ".thumbnails/")
+            thumbnail = member(thumbnail_name)
+            if thumbnail is None:
+                log.debug(f"missing thumbnail: {thumbnail_name}")
+
+            self.rm.append(RmPage(page, metadata, page_number, thumbnail,
+                                  self.ID))
+
+
+def _compress_type(name: str) -> int:
+    """Store members that are already compressed, deflate the others."""
+
+    if name.lower().endswith(STORED_EXTENSIONS):
+        return ZIP_STORED
+    return ZIP_DEFLATED
+
+
+def _write_file(zf: ZipFile, name: str, fp: FileOrPath) -> None:
+    """Copy a file object or location into a zipfile member in chunks."""
+
+    if isinstance(fp, (str, os.PathLike)):
+        with open(fp, 'rb') as f:
+            _write_file(zf, name, f)
+        return
+
+    zinfo = ZipInfo(name, date_time=time.localtime(time.time())[:6])
+    zinfo.compress_type = _compress_type(name)
+    zinfo._compresslevel = zf.compresslevel
+    fp.seek(0)
+    with zf.open(zinfo, 'w') as dest:
+        shutil.copyfileobj(fp, dest, CHUNK_SIZE)
+    fp.seek(0)
+
+
+def _deflate(fp: IO[bytes], compresslevel: int
+             ) -> Tuple[int, List[bytes], int, int, int]:
+    """Deflate a file object for :func:`_write_raw`.
 
-            try:
-                with zf.open(f"{self.ID}.epub", 'r') as epub:
-                    self.epub = BytesIO(epub.read())
-            except KeyError:
-                pass
+    Returns:
+        A tuple of the compress type, the deflated chunks, the CRC & size of
+        the uncompressed data and the size of the deflated data.
+    """
+
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -15)
+    chunks = []
+    crc = 0
+    size = 0
+    fp.seek(0)
+    for chunk in iter(lambda: fp.read(CHUNK_SIZE), b""):
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+        chunks.append(compressor.compress(chunk))
+    chunks.append(compressor.flush())
+    fp.seek(0)
+    return ZIP_DEFLATED, chunks, crc, size, sum(len(c) for c in chunks)
 
-            # Get Highlights
-            highlights = [x for x in zf.namelist()
-                     if x.startswith(f"{self.ID}.highlights/") and x.endswith('.json')]
-            for highlight in highlights:
-                with zf.open(highlight, 'r') as highlight_fp:
-                    page_id = highlight.replace(f"{self.ID}.highlights/", "").replace(".json", "")
-                    self.highlights.append(Highlight(page_id, highlight_fp.read()))
-
-            # Get the RM pages
-            pages = [x for x in zf.namelist()
-                     if x.startswith(f"{self.ID}/") and x.endswith('.rm')]
-            for p in pages:
-                page_number = int(p.replace(f"{self.ID}/", "")
-                                  .replace(".rm", ""))
-                with zf.open(p, 'r') as rm:
-                    page = BytesIO(rm.read())
-                    page.seek(0)
-
-                p_meta = p.replace(".rm", "-metadata.json")
-                try:
-                    with zf.open(p_meta, 'r') as md:
-                        metadata = json.load(md)
-                except KeyError:
-                    log.debug(f"missing metadata: {p_meta}")
-                    metadata = None
-                thumbnail_name = p.replace(".rm", ".jpg")
-                thumbnail_name = thumbnail_name.replace("/", ".thumbnails/")
-                try:
-                    with zf.open(thumbnail_name, 'r') as tn:
-                        thumbnail = BytesIO(tn.read())
-                        thumbnail.seek(0)
-                except KeyError:
-                    log.debug(f"missing thumbnail: {thumbnail_name}")
-                    thumbnail = None
-
-                self.rm.append(RmPage(page, metadata, page_number, thumbnail,
-                                      self.ID))
-
-        self.zipfile.seek(0)
-
-
-def from_zip(_id: str, file: str) -> ZipDocument:
+
+def _data_offset(info: ZipInfo, header: bytes) -> Optional[int]:
+    """Find where the data of a member starts from its local header.
+
+    Args:
+        info: The member.
+        header: The HEADER_SIZE bytes at the header_offset of the member.
+    Returns:
+        The offset of the data in the zipfile, or None if the header is not
+        valid.
+    """
+
+    if len(header) != HEADER_SIZE or header[:4] != b"PK\x03\x04":
+        return None
+    name_length, extra_length = struct.unpack("<HH", header[26:])
+    return info.header_offset + HEADER_SIZE + name_length + extra_length
+
+
+def _write_raw(zf: ZipFile, name: str, compress_type: int,
+               chunks: Iterable[bytes], crc: int, size: int,
+               compress_size: int) -> None:
+    """Write an already compressed member to a zipfile.
+
+    ZipFile has no public way to do this, so this does what
+    ZipFile.open(name, 'w') does, with the sizes & CRC known up front.
+
+    Args:
+        zf: A zipfile opened for writing.
+        name: The name of the member.
+        compress_type: How data is compressed, ZIP_DEFLATED or ZIP_STORED.
+        chunks: The compressed data.
+        crc: The CRC-32 of the uncompressed data.
+        size: The size of the uncompressed data.
+        compress_size: The size of the compressed data.
+    """
+
+    zinfo = ZipInfo(name, date_time=time.localtime(time.time())[:6])
+    zinfo.compress_type = compress_type
+    zinfo.external_attr = 0o600 << 16
+    zinfo.file_size = size
+    zinfo.compress_size = compress_size
+    zinfo.CRC = crc
+    zip64 = size > ZIP64_LIMIT or compress_size > ZIP64_LIMIT
+    with zf._lock:
+        if zf._writing:
+            raise ValueError("Can't write to the ZIP file while there is "
+                             "another write handle open on it.")
+        if zf._seekable:
+            zf.fp.seek(zf.start_dir)
+        zinfo.header_offset = zf.fp.tell()
+        zf._writecheck(zinfo)
+        zf._didModify = True
+        zf.fp.write(zinfo.FileHeader(zip64))
+        written = 0
+        for chunk in chunks:
+            zf.fp.write(chunk)
+            written += len(chunk)
+        if written != compress_size:
+            raise BadZipFile(f"Expected {compress_size} bytes for {name}, "
+                             f"got {written}")
+        zf.start_dir = zf.fp.tell()
+        zf.filelist.append(zinfo)
+        zf.NameToInfo[name] = zinfo
+
+
+def _copy_raw(zf: ZipFile, name: str, source: ZipFile, info: ZipInfo,
+              mapping: Optional[mmap.mmap] = None) -> None:
+    """Copy a member of another zipfile without decompressing it.
+
+    Args:
+        zf: A zipfile opened for writing.
+        name: The name of the member in zf.
+        source: The zipfile to copy from.
+        info: The member of source to copy.
+        mapping: A memory mapping of source, to copy from without reading.
+    """
+
+    def chunks() -> Iterator[bytes]:
+        offset = info.header_offset
+        if mapping is not None:
+            start = _data_offset(info, mapping[offset:offset + HEADER_SIZE])
+            if start is None:
+                raise BadZipFile(f"Bad local header for {info.filename}")
+            with memoryview(mapping) as view:
+                for i in range(start, start + info.compress_size,
+                               CHUNK_SIZE):
+                    with view[i:min(i + CHUNK_SIZE,
+                                    start + info.compress_size)] as chunk:
+                        yield chunk
+            return
+        with source._lock:
+            source.fp.seek(offset)
+            start = _data_offset(info, source.fp.read(HEADER_SIZE))
+            if start is None:
+                raise BadZipFile(f"Bad local header for {info.filename}")
+            source.fp.seek(start)
+            remaining = info.compress_size
+            while remaining:
+                chunk = source.fp.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise BadZipFile(f"Truncated data for {info.filename}")
+                remaining -= len(chunk)
+                yield chunk
+
+    _write_raw(zf, name, info.compress_type, chunks(), info.CRC,
+               info.file_size, info.compress_size)
+
+
+def from_zip(_id: str, file: FileOrPath, lazy: bool = False) -> ZipDocument:
     """Return A ZipDocument from a zipfile.
 
     Create a ZipDocument instance from a zipfile.
 
     Args:
         _id: The object ID this zipfile represents.
-        file: the filename of the zipfile.
+        file: the filename or a file object of the zipfile.
+        lazy: Read the members of the zipfile when they are used, see
+            :meth:`ZipDocument.load`.
     Returns:
         An instance of the supplied zipfile.
     """
 
-    return ZipDocument(_id, file=file)
+    return ZipDocument(_id, file=file, lazy=lazy)
 
 
 def from_request_stream(_id: str, stream:  Response) -> ZipDocument:
@@ -420,8 +977,39 @@ def from_request_stream(_id: str, stream:  Response) -> ZipDocument:
     """
 
     tmp = BytesIO()
-    for chunk in stream.iter_content(chunk_size=8192):
+    for chunk in stream.iter_content(chunk_size=CHUNK_SIZE):
         tmp.write(chunk)
     zd = ZipDocument(_id=_id)
     zd.load(tmp)
     return zd
+
+
+def to_file(stream: Response, file: Optional[FileOrPath] = None,
+            chunk_size: int = CHUNK_SIZE) -> FileOrPath:
+    """Write a request stream containing a zipfile to a file.
+
+    The stream is written chunk by chunk, so only chunk_size bytes are kept
+    in memory. The result can be opened with :func:`from_zip`, or loaded
+    with :meth:`ZipDocument.load`.
+
+    Args:
+        stream: a stream containing the zipfile.
+        file: A file location or a file object to write to. If None, a
+            temporary file is used that is kept in memory up to SPOOL_SIZE
+            bytes.
+        chunk_size: The size of the chunks to read from the stream.
+    Returns:
+        The file location, or the file object positioned at the start.
+    """
+
+    if file is None:
+        file = SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'wb') as f:
+            for chunk in stream.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+    else:
+        for chunk in stream.iter_content(chunk_size=chunk_size):
+            file.write(chunk)
+        file.seek(0)
+    return file
@@ -33,19 +33,23 @@ class Folder(Meta):
     A Meta type of object used to represent a folder.
     """
 
+    __slots__ = ()
+
     def __init__(self, name: Optional[str] = None, **kwargs) -> None:
         """Create a Folder instance
 
         Args:
             name: An optional name for this folder. In the end, a name is
                 really needed, but can be omitted to set a later time.
+            **kwargs: The meta attributes. A new ID is generated when ID is
+                not given, ID="" is the root folder.
         """
 
         super(Folder, self).__init__(**kwargs)
         self.Type = "CollectionType"
         if name:
             self.VissibleName = name
-        if not self.ID:
+        if "ID" not in kwargs:
             self.ID = str(uuid4())
 
     def create_request(self) -> Tuple[BytesIO, dict]:
@@ -0,0 +1,190 @@
+import struct
+from typing import IO, Union
+from .exceptions import UnsupportedTypeError
+
+HEADER_SIZE = 43
+HEADERS = {
+    b"reMarkable .lines file, version=3          ": 3,
+    b"reMarkable .lines file, version=5          ": 5,
+}
+COUNT = struct.Struct("<I")
+# pen, color, unknown, width, (unknown in version 5,) number of points
+STROKES = {
+    3: struct.Struct("<IIIfI"),
+    5: struct.Struct("<IIIffI"),
+}
+POINT_FIELDS = ("x", "y", "speed", "direction", "width", "pressure")
+POINT_SIZE = 4 * len(POINT_FIELDS)
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+def _numpy():
+    """Import numpy, which is only needed to parse pages."""
+
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("Parsing .rm pages needs numpy, install it with "
+                          "pip install rmapy[lines]") from None
+    return numpy
+
+
+class Lines(object):
+    """The strokes of a .rm page
+
+    All points of all strokes are in one contiguous array. The points of
+    stroke i are ``points[offsets[i]:offsets[i + 1]]``, see :meth:`stroke`.
+
+    Attributes:
+        version: The version of the lines format, 3 or 5.
+        points: A numpy structured array with the float32 fields x, y,
+            speed, direction, width & pressure of every point.
+        strokes: A numpy structured array with the layer, pen, color &
+            width of every stroke.
+        offsets: An int64 array with the index of the first point of every
+            stroke, and the number of points at the end.
+        layer_offsets: An int64 array with the index of the first stroke of
+            every layer, and the number of strokes at the end.
+    """
+
+    def __init__(self, version: int, points, strokes, offsets,
+                 layer_offsets):
+        self.version = version
+        self.points = points
+        self.strokes = strokes
+        self.offsets = offsets
+        self.layer_offsets = layer_offsets
+
+    @property
+    def layers(self) -> int:
+        """The number of layers."""
+
+        return len(self.layer_offsets) - 1
+
+    def stroke(self, index: int):
+        """Get the points of a stroke, without copying them.
+
+        Args:
+            index: The index of the stroke.
+        """
+
+        return self.points[self.offsets[index]:self.offsets[index + 1]]
+
+    def layer(self, index: int) -> range:
+        """Get the indexes of the strokes in a layer.
+
+        Args:
+            index: The index of the layer.
+        """
+
+        return range(self.layer_offsets[index], self.layer_offsets[index + 1])
+
+    def __len__(self) -> int:
+        return len(self.strokes)
+
+    def __str__(self) -> str:
+        return (f"<rmapy.lines.Lines v{self.version} {len(self.strokes)} "
+                f"strokes, {len(self.points)} points>")
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def parse(data: BytesLike) -> Lines:
+    """Parse a .rm page in the lines format of version 3 or 5.
+
+    Only the stroke headers are read one by one. The points are copied out
+    of the page in one go and viewed as a structured array, so no Python
+    objects are created per point.
+
+    Args:
+        data: The content of the .rm page.
+    Returns:
+        The layers, strokes & points of the page.
+    Raises:
+        UnsupportedTypeError: When the page is not in version 3 or 5.
+        ValueError: When the page is truncated.
+    """
+
+    np = _numpy()
+    version = HEADERS.get(bytes(data[:HEADER_SIZE]))
+    if version is None:
+        raise UnsupportedTypeError(
+            f"Unsupported .rm page: {bytes(data[:HEADER_SIZE])!r}")
+    stroke_header = STROKES[version]
+    unpack_stroke = stroke_header.unpack_from
+    unpack_count = COUNT.unpack_from
+
+    strokes = []
+    starts = []
+    counts = []
+    layer_offsets = [0]
+    position = HEADER_SIZE
+    try:
+        (layers,) = unpack_count(data, position)
+        position += COUNT.size
+        for layer in range(layers):
+            (count,) = unpack_count(data, position)
+            position += COUNT.size
+            for _ in range(count):
+                fields = unpack_stroke(data, position)
+                position += stroke_header.size
+                strokes.append((layer, fields[0], fields[1], fields[3]))
+                starts.append(position)
+                counts.append(fields[-1])
+                position += fields[-1] * POINT_SIZE
+            layer_offsets.append(len(strokes))
+    except struct.error:
+        raise ValueError("Truncated .rm page") from None
+    if position > len(data):
+        raise ValueError("Truncated .rm page")
+
+    counts = np.asarray(counts, dtype=np.int64)
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    # Everything after the layer count is 4 byte aligned. Viewing the page
+    # as overlapping points at every 4 bytes, the points of all strokes are
+    # copied out in one gather.
+    body = HEADER_SIZE + COUNT.size
+    words = (position - body) // 4
+    rows = np.ndarray((max(words - POINT_SIZE // 4 + 1, 0),),
+                      dtype=f"V{POINT_SIZE}", buffer=data, offset=body,
+                      strides=(4,))
+    starts = (np.asarray(starts, dtype=np.int64) - body) // 4
+    rows_at = np.repeat(starts - offsets[:-1] * (POINT_SIZE // 4), counts)
+    rows_at += np.arange(offsets[-1], dtype=np.int64) * (POINT_SIZE // 4)
+    point_type = np.dtype([(f, "<f4") for f in POINT_FIELDS])
+    points = rows[rows_at].view(point_type)
+
+    stroke_type = np.dtype([("layer", "<u4"), ("pen", "<u4"),
+                            ("color", "<u4"), ("width", "<f4")])
+    return Lines(version, points, np.array(strokes, dtype=stroke_type),
+                 offsets, np.asarray(layer_offsets, dtype=np.int64))
+
+
+def load(fp: IO[bytes]) -> Lines:
+    """Parse a .rm page from a file object.
+
+    The content of a BytesIO and the stored pages of a memory mapped
+    :class:`rmapy.document.ZipMember` are parsed without copying them
+    first.
+
+    Args:
+        fp: The page, like :attr:`rmapy.document.RmPage.page`.
+    Returns:
+        The layers, strokes & points of the page.
+    """
+
+    if hasattr(fp, "getbuffer"):
+        view = fp.getbuffer()
+    elif hasattr(fp, "view"):
+        view = fp.view()
+    else:
+        fp.seek(0)
+        data = fp.read()
+        fp.seek(0)
+        return parse(data)
+    with view:
+        return parse(view)
@@ -1,3 +1,69 @@
+from datetime import datetime, timedelta
+from typing import Optional, Union
+from .const import BLOB_URL_MARGIN
+
+
+def parse_datetime(value: str) -> Optional[datetime]:
+    """Parse an RFC3339 UTC timestamp as used by the Remarkable Cloud.
+
+    Fractions are truncated to microseconds, as the cloud can send
+    nanoseconds.
+
+    Args:
+        value: A timestamp like 2019-09-18T20:12:07.206206Z
+    Returns:
+        A naive datetime in UTC, or None if the value cannot be parsed.
+    """
+
+    if not value:
+        return None
+    value = value.rstrip("Z")
+    if value.endswith("+00:00"):
+        value = value[:-6]
+    value, _, fraction = value.partition(".")
+    # Sliced by hand, as strptime is slow for whole listings.
+    if (len(value) != 19 or value[4] != "-" or value[7] != "-"
+            or value[10] != "T" or value[13] != ":" or value[16] != ":"):
+        return None
+    fields = (value[0:4], value[5:7], value[8:10], value[11:13],
+              value[14:16], value[17:19])
+    if not "".join(fields).isdigit():
+        return None
+    try:
+        parsed = datetime(*map(int, fields))
+    except ValueError:
+        return None
+    if fraction.isdigit():
+        parsed = parsed.replace(microsecond=int(fraction[:6].ljust(6, "0")))
+    return parsed
+
+
+def timestamp_key(value: Union[str, datetime]) -> str:
+    """Turn a timestamp into a string that sorts in time order.
+
+    This is a lot cheaper than :func:`parse_datetime` when only the order of
+    timestamps matters.
+
+    Args:
+        value: An RFC3339 UTC timestamp like 2019-09-18T20:12:07.206206Z, or
+            a naive datetime in UTC.
+    Returns:
+        A string like 2019-09-18T20:12:07206206000, or an empty string if
+        the value is not a timestamp.
+    """
+
+    if isinstance(value, datetime):
+        return (value.strftime("%Y-%m-%dT%H:%M:%S")
+                + f"{value.microsecond:06d}000")
+    value = value.rstrip("Z")
+    if value.endswith("+00:00"):
+        value = value[:-6]
+    value, _, fraction = value.partition(".")
+    if len(value) != 19 or value[10] != "T":
+        return ""
+    return value + fraction[:9].ljust(9, "0")
+
+
 class Meta(object):
     """ Meta represents a real object expected in most
     calls by the remarkable API
@@ -8,6 +74,8 @@ class Meta(object):
         ID: Id of the meta object.
         Version: The version of this object.
         Success: If the last API Call was a success.
+        Conflict: If the last API Call was rejected because of a version
+            conflict.
         BlobURLGet: The url to get the data blob from. Can be empty.
         BlobURLGetExpires: The expiration date of the Get url.
         BlobURLPut: The url to upload the data blob to. Can be empty.
@@ -21,27 +89,53 @@ class Meta(object):
         Parent: If empty, this object is is the root folder. This can be an ID
             of a CollectionType.
 
+    The attributes are stored in slots instead of a per instance dict, to
+    keep large collections small. Subclasses should define __slots__ too.
+
     """
 
-    ID = ""
-    Version = 0
-    Message = ""
-    Success = True
-    BlobURLGet = ""
-    BlobURLGetExpires = ""
-    BlobURLPut = ""
-    BlobURLPutExpires = ""
-    ModifiedClient = ""
-    Type = ""
-    VissibleName = ""
-    CurrentPage = 1
-    Bookmarked = False
-    Parent = ""
+    __slots__ = ("ID", "Version", "Message", "Success", "Conflict",
+                 "BlobURLGet",
+                 "BlobURLGetExpires", "BlobURLPut", "BlobURLPutExpires",
+                 "ModifiedClient", "Type", "VissibleName", "CurrentPage",
+                 "Bookmarked", "Parent")
 
     def __init__(self, **kwargs):
-        k_keys = self.to_dict().keys()
-        for k in k_keys:
-            setattr(self, k, kwargs.get(k, getattr(self, k)))
+        get = kwargs.get
+        self.ID = get("ID", "")
+        self.Version = get("Version", 0)
+        self.Message = get("Message", "")
+        self.Success = get("Success", True)
+        self.Conflict = False
+        self.BlobURLGet = get("BlobURLGet", "")
+        self.BlobURLGetExpires = get("BlobURLGetExpires", "")
+        self.BlobURLPut = get("BlobURLPut", "")
+        self.BlobURLPutExpires = get("BlobURLPutExpires", "")
+        self.ModifiedClient = get("ModifiedClient", "")
+        self.Type = get("Type", "")
+        self.VissibleName = get("VissibleName", "")
+        self.CurrentPage = get("CurrentPage", 1)
+        self.Bookmarked = get("Bookmarked", False)
+        self.Parent = get("Parent", "")
+
+    def blob_url_get_expired(self, margin: int = BLOB_URL_MARGIN) -> bool:
+        """Is the BlobURLGet missing or about to expire
+
+        A url without a known expiration date is considered valid.
+
+        Args:
+            margin: The number of seconds before the expiration date the url
+                is considered expired.
+        Returns:
+            True if BlobURLGet cannot be used anymore.
+        """
+
+        if not self.BlobURLGet:
+            return True
+        expires = parse_datetime(self.BlobURLGetExpires)
+        if expires is None:
+            return False
+        return expires - timedelta(seconds=margin) <= datetime.utcnow()
 
     def to_dict(self) -> dict:
         """Return a dict representation of this object.
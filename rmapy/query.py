@@ -0,0 +1,313 @@
+import heapq
+from datetime import datetime
+from fnmatch import fnmatchcase
+from typing import (Callable, Dict, Iterator, List, Optional, Tuple, Union,
+                    TYPE_CHECKING)
+from .document import Document
+from .folder import Folder
+from .meta import parse_datetime, timestamp_key
+
+if TYPE_CHECKING:
+    from .collections import Collection
+
+DocumentOrFolder = Union[Document, Folder]
+Predicate = Callable[[DocumentOrFolder], bool]
+DateOrString = Union[datetime, str]
+
+
+def _as_key(value: DateOrString) -> str:
+    if not isinstance(value, datetime) and parse_datetime(value) is None:
+        raise ValueError(f"Not a timestamp: {value}")
+    return timestamp_key(value)
+
+
+def _modified(item: DocumentOrFolder) -> str:
+    return timestamp_key(item.ModifiedClient)
+
+
+class _Condition(object):
+    """A condition of a query.
+
+    Attributes:
+        predicate: Checks a single item.
+        lookup: Returns the matching items from an index, or None when there
+            is no index to use.
+        exact: Whether the items of the lookup all match the predicate.
+    """
+
+    def __init__(self, predicate: Predicate,
+                 lookup: Callable[[], Optional[Dict[str, DocumentOrFolder]]],
+                 exact: bool = True):
+        self.predicate = predicate
+        self.lookup = lookup
+        self.exact = exact
+
+
+class Query(object):
+    """A query over the items of a :class:`rmapy.collections.Collection`
+
+    A query is built by chaining conditions, every call returns a new query:
+
+    .. code-block:: python
+
+        recent = (collection.query()
+                  .documents()
+                  .where(Bookmarked=True)
+                  .under(folder)
+                  .modified_since("2020-01-01T00:00:00Z")
+                  .order_by("ModifiedClient", reverse=True)
+                  .limit(10)
+                  .all())
+
+    Conditions on an indexed field are answered from the index, see
+    :meth:`rmapy.collections.Collection.create_index`. Only the remaining
+    conditions are checked item by item, on the smallest set of items the
+    indexes narrowed it down to. Without an index, the whole collection is
+    scanned.
+
+    The metadata does not contain the file type of a document. To match on
+    anything else, like the extension of the name, use :meth:`name_matches`
+    or :meth:`filter`.
+    """
+
+    def __init__(self, collection: "Collection"):
+        self.collection = collection
+        self._conditions: List[_Condition] = []
+        self._order: Optional[Tuple[str, bool]] = None
+        self._limit: Optional[int] = None
+
+    def _with(self, condition: Optional[_Condition] = None) -> "Query":
+        query = Query(self.collection)
+        query._conditions = list(self._conditions)
+        query._order = self._order
+        query._limit = self._limit
+        if condition is not None:
+            query._conditions.append(condition)
+        return query
+
+    def where(self, **fields) -> "Query":
+        """Match items with attributes equal to the given values.
+
+        Args:
+            fields: Attribute names & values, like Bookmarked=True.
+        """
+
+        query = self
+        for field, value in fields.items():
+            query = query._with(_Condition(
+                lambda i, f=field, v=value: getattr(i, f) == v,
+                lambda f=field, v=value: self.collection._lookup(f, v),
+                exact=field not in ("VissibleName", "ModifiedClient")))
+        return query
+
+    def documents(self) -> "Query":
+        """Match documents only."""
+
+        return self.where(Type="DocumentType")
+
+    def folders(self) -> "Query":
+        """Match folders only."""
+
+        return self.where(Type="CollectionType")
+
+    def in_folder(self, folder: Optional[Folder] = None) -> "Query":
+        """Match the direct children of a folder.
+
+        Args:
+            folder: The folder. If None, the items in the root.
+        """
+
+        return self.where(Parent=folder.ID if folder else "")
+
+    def under(self, folder: Folder) -> "Query":
+        """Match everything in a folder and its subfolders.
+
+        Args:
+            folder: The top folder.
+        """
+
+        def lookup() -> Dict[str, DocumentOrFolder]:
+            return {i.ID: i for i in self.collection.walk(folder)}
+
+        # The lookup always works, as Parent is always indexed.
+        return self._with(_Condition(lambda i: True, lookup))
+
+    def name_matches(self, pattern: str) -> "Query":
+        """Match items with a name matching a pattern, ignoring case.
+
+        Args:
+            pattern: A :mod:`fnmatch` pattern like ``*report*.pdf``.
+        """
+
+        folded = pattern.casefold()
+        return self._with(_Condition(
+            lambda i: fnmatchcase(i.VissibleName.casefold(), folded),
+            lambda: self.collection._lookup_names(pattern)))
+
+    def _modified_range(self, since: Optional[str],
+                        before: Optional[str]) -> "Query":
+        def predicate(item: DocumentOrFolder) -> bool:
+            modified = _modified(item)
+            return ((since is None or modified >= since)
+                    and (before is None or modified < before))
+
+        def lookup() -> Optional[Dict[str, DocumentOrFolder]]:
+            items = self.collection._lookup_modified(since, before)
+            if items is None:
+                return None
+            return {i.ID: i for i in items}
+
+        return self._with(_Condition(predicate, lookup))
+
+    def modified_since(self, when: DateOrString) -> "Query":
+        """Match items modified by the client at or after a moment.
+
+        Args:
+            when: A naive UTC datetime or an RFC3339 timestamp.
+        """
+
+        return self._modified_range(_as_key(when), None)
+
+    def modified_before(self, when: DateOrString) -> "Query":
+        """Match items modified by the client before a moment.
+
+        Args:
+            when: A naive UTC datetime or an RFC3339 timestamp.
+        """
+
+        return self._modified_range(None, _as_key(when))
+
+    def filter(self, predicate: Predicate) -> "Query":
+        """Match items for which a function returns True.
+
+        Args:
+            predicate: A function taking a Document or Folder.
+        """
+
+        return self._with(_Condition(predicate, lambda: None))
+
+    def order_by(self, field: str, reverse: bool = False) -> "Query":
+        """Sort the results on an attribute.
+
+        ModifiedClient is sorted as a date and VissibleName ignoring case.
+
+        Args:
+            field: The attribute to sort on.
+            reverse: Sort descending.
+        """
+
+        query = self._with()
+        query._order = (field, reverse)
+        return query
+
+    def limit(self, count: int) -> "Query":
+        """Return at most count results.
+
+        Args:
+            count: The maximum number of results.
+        """
+
+        query = self._with()
+        query._limit = count
+        return query
+
+    def _candidates(self) -> Tuple[Optional[Dict[str, DocumentOrFolder]],
+                                   List[Predicate]]:
+        """Narrow down the items with the indexes.
+
+        Returns:
+            A tuple of the candidate items, or None for all items, and the
+            predicates still to check on every candidate.
+        """
+
+        found: List[Dict[str, DocumentOrFolder]] = []
+        predicates: List[Predicate] = []
+        for condition in self._conditions:
+            matches = condition.lookup()
+            if matches is None:
+                predicates.append(condition.predicate)
+                continue
+            found.append(matches)
+            if not condition.exact:
+                predicates.append(condition.predicate)
+        if not found:
+            return None, predicates
+        found.sort(key=len)
+        candidates = found[0]
+        for other in found[1:]:
+            if not candidates:
+                break
+            candidates = {k: v for k, v in candidates.items() if k in other}
+        return candidates, predicates
+
+    def _sort_key(self) -> Callable[[DocumentOrFolder], object]:
+        field = self._order[0]
+        if field == "ModifiedClient":
+            return _modified
+        if field == "VissibleName":
+            return lambda i: i.VissibleName.casefold()
+        return lambda i: getattr(i, field)
+
+    def __iter__(self) -> Iterator[DocumentOrFolder]:
+        candidates, predicates = self._candidates()
+        if candidates is None:
+            items = self.collection.items
+        else:
+            items = candidates.values()
+
+        order = self._order
+        if (order is not None and order[0] == "ModifiedClient"
+                and self._limit is not None):
+            # Walking the sorted index stops after limit matches, which is
+            # cheaper than sorting unless there are few candidates left.
+            total = len(self.collection)
+            if candidates is None or (self._limit * total
+                                      < len(candidates) ** 2):
+                ordered = self.collection._iter_modified(order[1])
+                if ordered is not None:
+                    if candidates is None:
+                        items = ordered
+                    else:
+                        items = (i for i in ordered if i.ID in candidates)
+                    order = None
+
+        matches = (i for i in items if all(p(i) for p in predicates))
+        if order is not None:
+            key = self._sort_key()
+            if self._limit is None:
+                matches = iter(sorted(matches, key=key, reverse=order[1]))
+            elif order[1]:
+                matches = iter(heapq.nlargest(self._limit, matches, key=key))
+            else:
+                matches = iter(heapq.nsmallest(self._limit, matches, key=key))
+
+        count = 0
+        for item in matches:
+            if self._limit is not None and count >= self._limit:
+                return
+            count += 1
+            yield item
+
+    def all(self) -> List[DocumentOrFolder]:
+        """Run the query.
+
+        Returns:
+            The matching items. Unless sorted with :meth:`order_by`, in no
+            particular order.
+        """
+
+        return list(self)
+
+    def first(self) -> Optional[DocumentOrFolder]:
+        """Run the query for a single item.
+
+        Returns:
+            The first matching item, or None.
+        """
+
+        return next(iter(self.limit(1)), None)
+
+    def count(self) -> int:
+        """Run the query and count the matching items."""
+
+        return sum(1 for _ in self)
@@ -0,0 +1,194 @@
+import os
+import sys
+import json
+import mmap
+import struct
+from array import array
+from typing import Dict, Iterable, List, Optional, Union
+from .document import Document
+from .folder import Folder
+
+DocumentOrFolder = Union[Document, Folder]
+
+MAGIC = b"RMAPYSN1"
+# magic, byte order, item count & the offsets of the sections.
+HEADER = struct.Struct("<8sB7xQQQQQQ")
+
+
+def _byteorder() -> int:
+    return 1 if sys.byteorder == "little" else 2
+
+
+def _item(doc_dict: dict) -> DocumentOrFolder:
+    if doc_dict.get("Type") == "CollectionType":
+        return Folder(**doc_dict)
+    return Document(**doc_dict)
+
+
+def write_snapshot(path: str, items: Iterable[DocumentOrFolder]) -> None:
+    """Write meta items to a snapshot file
+
+    The file is written next to the snapshot & moved in place, so a reader
+    never sees a partially written snapshot.
+
+    A snapshot holds the items as a JSON array, with the offset of every
+    item and an index of the IDs in sorted order, so a single item can be
+    read without parsing the others.
+
+    Args:
+        path: The location of the snapshot.
+        items: The documents & folders to store.
+    """
+
+    records: List[bytes] = []
+    ids: List[bytes] = []
+    for item in items:
+        records.append(json.dumps(item.to_dict(),
+                                  separators=(",", ":")).encode())
+        ids.append(item.ID.encode())
+
+    count = len(records)
+    record_offsets = array("Q", [0] * (count + 1))
+    # Skip the "[" opening the JSON array, and the "," after every item.
+    offset = 1
+    for i, record in enumerate(records):
+        record_offsets[i] = offset
+        offset += len(record) + 1
+    record_offsets[count] = offset
+    id_offsets = array("Q", [0] * (count + 1))
+    offset = 0
+    for i, _id in enumerate(ids):
+        id_offsets[i] = offset
+        offset += len(_id)
+    id_offsets[count] = offset
+    order = array("Q", sorted(range(count), key=ids.__getitem__))
+
+    record_offsets_at = HEADER.size
+    id_offsets_at = record_offsets_at + len(record_offsets) * 8
+    order_at = id_offsets_at + len(id_offsets) * 8
+    ids_at = order_at + len(order) * 8
+    records_at = ids_at + id_offsets[count]
+
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as snapshot_file:
+        snapshot_file.write(HEADER.pack(
+            MAGIC, _byteorder(), count, record_offsets_at, id_offsets_at,
+            order_at, ids_at, records_at))
+        snapshot_file.write(record_offsets.tobytes())
+        snapshot_file.write(id_offsets.tobytes())
+        snapshot_file.write(order.tobytes())
+        snapshot_file.write(b"".join(ids))
+        snapshot_file.write(b"[" + b",".join(records) + b"]")
+    os.replace(tmp, path)
+
+
+class Snapshot(object):
+    """A memory mapped snapshot of meta items
+
+    Opening a snapshot only maps the file. Items are parsed when they are
+    accessed, and then kept, so the same item is returned every time.
+
+    Attributes:
+        path: The location of the snapshot.
+    """
+
+    def __init__(self, path: str):
+        """Open a snapshot
+
+        Args:
+            path: The location of a snapshot written with
+                :func:`write_snapshot`.
+        Raises:
+            ValueError: When the file is not a snapshot of this machine.
+        """
+
+        self.path = path
+        with open(path, 'rb') as snapshot_file:
+            self._mmap = mmap.mmap(snapshot_file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+        if len(self._mmap) < HEADER.size:
+            self.close()
+            raise ValueError(f"Not a snapshot: {path}")
+        (magic, byteorder, self._count, record_offsets_at, id_offsets_at,
+         order_at, self._ids_at, self._records_at) = HEADER.unpack_from(
+            self._mmap)
+        if magic != MAGIC or byteorder != _byteorder():
+            self.close()
+            raise ValueError(f"Not a snapshot of this machine: {path}")
+
+        view = self._view = memoryview(self._mmap)
+        self._record_offsets = view[record_offsets_at:id_offsets_at].cast("Q")
+        self._id_offsets = view[id_offsets_at:order_at].cast("Q")
+        self._order = view[order_at:self._ids_at].cast("Q")
+        self._items: Dict[int, DocumentOrFolder] = {}
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _id(self, position: int) -> bytes:
+        start = self._ids_at + self._id_offsets[position]
+        end = self._ids_at + self._id_offsets[position + 1]
+        return self._mmap[start:end]
+
+    def item(self, position: int) -> DocumentOrFolder:
+        """Get the item at a position
+
+        Args:
+            position: The position of the item, negative positions count
+                from the end.
+        Raises:
+            IndexError: When there is no item at the position.
+        """
+
+        if position < 0:
+            position += self._count
+        if not 0 <= position < self._count:
+            raise IndexError("snapshot index out of range")
+        item = self._items.get(position)
+        if item is None:
+            start = self._records_at + self._record_offsets[position]
+            end = self._records_at + self._record_offsets[position + 1] - 1
+            item = _item(json.loads(self._mmap[start:end]))
+            self._items[position] = item
+        return item
+
+    def get(self, _id: str) -> Optional[DocumentOrFolder]:
+        """Get an item by ID, with a binary search of the ID index
+
+        Args:
+            _id: The ID of the item.
+        Returns:
+            The item, or None if it is not in the snapshot.
+        """
+
+        key = _id.encode()
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._id(self._order[middle]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._count and self._id(self._order[low]) == key:
+            return self.item(self._order[low])
+        return None
+
+    def items(self) -> List[DocumentOrFolder]:
+        """Get all items, parsing the ones not accessed yet in one go."""
+
+        if len(self._items) < self._count:
+            end = self._records_at + self._record_offsets[self._count]
+            dicts = json.loads(self._mmap[self._records_at:end])
+            for position, doc_dict in enumerate(dicts):
+                if position not in self._items:
+                    self._items[position] = _item(doc_dict)
+        return [self._items[i] for i in range(self._count)]
+
+    def close(self) -> None:
+        """Unmap the snapshot file."""
+
+        for name in ("_record_offsets", "_id_offsets", "_order", "_view"):
+            view = self.__dict__.pop(name, None)
+            if view is not None:
+                view.release()
+        self._mmap.close()
@@ -0,0 +1,561 @@
+import os
+import hashlib
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+from typing import Dict, List, Optional, Tuple, Union
+from .api import Client
+from .collections import Collection
+from .document import Document, ZipDocument, from_zip
+from .folder import Folder
+from .const import CHUNK_SIZE, POOL_MAXSIZE
+
+log = getLogger("rmapy")
+DocumentOrFolder = Union[Document, Folder]
+STATE_FILE = ".rmapy-sync.db"
+UPLOAD_EXTENSIONS = (".pdf", ".epub")
+
+
+def file_hash(path: str) -> str:
+    """Return the sha256 of a file, read in chunks.
+
+    Args:
+        path: The location of the file.
+    """
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def safe_name(name: str) -> str:
+    """Make the name of a meta item usable as a file name."""
+
+    for sep in ("/", "\\", os.sep):
+        name = name.replace(sep, "_")
+    if name in ("", ".", ".."):
+        name = "_"
+    return name
+
+
+class SyncState(object):
+    """The state of the last sync, stored in a sqlite database.
+
+    For every synced meta item, the state holds its local path relative to
+    the synced directory, the version it was synced at and the sha256 of
+    its local zipfile. It also holds the pdf & epub files that were
+    uploaded from the synced directory.
+    """
+
+    def __init__(self, path: str):
+        """Open or create the state database
+
+        Args:
+            path: The location of the database.
+        """
+
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS items ("
+                        "id TEXT PRIMARY KEY, path TEXT, version INTEGER, "
+                        "hash TEXT, type TEXT)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS sources ("
+                        "path TEXT PRIMARY KEY, id TEXT, hash TEXT)")
+        self.db.commit()
+
+    def items(self) -> Dict[str, Tuple[str, int, str, str]]:
+        """Return a dict mapping an ID to (path, version, hash, type)."""
+
+        rows = self.db.execute(
+            "SELECT id, path, version, hash, type FROM items")
+        return {r[0]: (r[1], r[2], r[3], r[4]) for r in rows}
+
+    def set_item(self, _id: str, path: str, version: int, _hash: str,
+                 _type: str) -> None:
+        self.db.execute("INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?)",
+                        (_id, path, int(version), _hash, _type))
+
+    def remove_item(self, _id: str) -> None:
+        self.db.execute("DELETE FROM items WHERE id = ?", (_id,))
+
+    def sources(self) -> Dict[str, Tuple[str, str]]:
+        """Return a dict mapping an uploaded file's path to (ID, hash)."""
+
+        rows = self.db.execute("SELECT path, id, hash FROM sources")
+        return {r[0]: (r[1], r[2]) for r in rows}
+
+    def set_source(self, path: str, _id: str, _hash: str) -> None:
+        self.db.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?)",
+                        (path, _id, _hash))
+
+    def move_prefix(self, old: str, new: str) -> None:
+        """Rewrite the paths under directory old to be under new."""
+
+        for table in ("items", "sources"):
+            self.db.execute(
+                f"UPDATE {table} SET path = ? || substr(path, ?) "
+                "WHERE substr(path, 1, ?) = ?",
+                (new + "/", len(old) + 2, len(old) + 1, old + "/"))
+
+    def commit(self) -> None:
+        self.db.commit()
+
+    def close(self) -> None:
+        self.db.close()
+
+
+class SyncReport(object):
+    """The result of a sync.
+
+    All paths are relative to the synced directory.
+
+    Attributes:
+        pulled: Paths of zipfiles downloaded from the cloud.
+        pushed: Paths of zipfiles & files uploaded to the cloud.
+        moved: Paths of documents moved or renamed, locally or in the cloud.
+        created: Paths of folders created in the cloud.
+        deleted_local: Paths deleted locally.
+        deleted_remote: Paths deleted in the cloud.
+        conflicts: Paths changed both locally and in the cloud.
+        errors: A dict mapping a path to the error syncing it.
+    """
+
+    def __init__(self):
+        self.pulled: List[str] = []
+        self.pushed: List[str] = []
+        self.moved: List[str] = []
+        self.created: List[str] = []
+        self.deleted_local: List[str] = []
+        self.deleted_remote: List[str] = []
+        self.conflicts: List[str] = []
+        self.errors: Dict[str, Exception] = {}
+
+    def __str__(self) -> str:
+        return (f"<rmapy.sync.SyncReport {len(self.pulled)} pulled, "
+                f"{len(self.pushed)} pushed, {len(self.moved)} moved, "
+                f"{len(self.deleted_local) + len(self.deleted_remote)} "
+                f"deleted, {len(self.conflicts)} conflicts, "
+                f"{len(self.errors)} errors>")
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class SyncEngine(object):
+    """Two-way sync between a local directory and the Remarkable Cloud
+
+    Folders are mirrored as directories and documents as their raw zipfile,
+    named <VissibleName>.zip. Only what changed since the last sync is
+    transferred: a document is pulled when its version in the cloud changed
+    and pushed when the hash of its zipfile changed. A document changed on
+    both sides is reported as a conflict and left alone. A zipfile missing
+    from the state, like one pulled by an interrupted sync, is only a
+    conflict when it differs from the zipfile in the cloud.
+
+    New pdf & epub files in the directory are uploaded as new documents,
+    and new directories are created as folders. Moving or renaming a
+    zipfile locally moves or renames the document in the cloud.
+
+    Attributes:
+        client: The client to sync with.
+        local_dir: The directory to sync.
+        state: The state of the last sync.
+        workers: The number of transfers to run in parallel.
+        delete: Propagate deletions. If False, nothing is deleted on either
+            side.
+    """
+
+    def __init__(self, client: Client, local_dir: str,
+                 state_path: Optional[str] = None,
+                 workers: int = POOL_MAXSIZE,
+                 delete: bool = True):
+        """Create a new SyncEngine
+
+        Args:
+            client: An authenticated client.
+            local_dir: The directory to sync.
+            state_path: The location of the state database. Defaults to a
+                .rmapy-sync.db file in local_dir.
+            workers: The number of transfers to run in parallel.
+            delete: Propagate deletions.
+        """
+
+        self.client = client
+        self.local_dir = local_dir
+        os.makedirs(local_dir, exist_ok=True)
+        if state_path is None:
+            state_path = os.path.join(local_dir, STATE_FILE)
+        self.state = SyncState(state_path)
+        self.workers = workers
+        self.delete = delete
+
+    def _abs(self, path: str) -> str:
+        return os.path.join(self.local_dir, *path.split("/"))
+
+    def _remote_tree(self, collection: Collection
+                     ) -> Dict[str, Tuple[str, DocumentOrFolder]]:
+        """Map the ID of every item reachable from the root to its path."""
+
+        tree: Dict[str, Tuple[str, DocumentOrFolder]] = {}
+        taken = set()
+        stack: List[Tuple[str, Optional[Folder]]] = [("", None)]
+        while stack:
+            prefix, folder = stack.pop()
+            children = sorted(collection.children(folder),
+                              key=lambda i: i.ID)
+            for item in children:
+                name = safe_name(item.VissibleName or item.ID)
+                suffix = ".zip" if isinstance(item, Document) else ""
+                path = f"{prefix}{name}{suffix}"
+                if path in taken:
+                    path = f"{prefix}{name} ({item.ID[:8]}){suffix}"
+                taken.add(path)
+                tree[item.ID] = (path, item)
+                if isinstance(item, Folder):
+                    stack.append((path + "/", item))
+        return tree
+
+    def _scan(self) -> Tuple[List[str], List[str]]:
+        """Return the relative paths of the local directories & files."""
+
+        dirs: List[str] = []
+        files: List[str] = []
+        for root, dirnames, filenames in os.walk(self.local_dir):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+            rel = os.path.relpath(root, self.local_dir)
+            prefix = "" if rel == "." else rel.replace(os.sep, "/") + "/"
+            dirs.extend(prefix + d for d in dirnames)
+            files.extend(prefix + f for f in filenames
+                         if not f.startswith(".") and not f.endswith(".part"))
+        return dirs, files
+
+    def sync(self) -> SyncReport:
+        """Sync the local directory with the Remarkable Cloud.
+
+        Returns:
+            A SyncReport of what was transferred.
+        """
+
+        report = SyncReport()
+        collection = self.client.get_meta_items(with_blob=True)
+        tree = self._remote_tree(collection)
+        state = self.state.items()
+        folder_ids = {path: item.ID for path, item in tree.values()
+                      if isinstance(item, Folder)}
+        folder_ids[""] = ""
+
+        self._sync_folders(tree, state)
+        self.state.commit()
+        state = self.state.items()
+
+        pulls: List[Tuple[Document, str, Optional[str]]] = []
+        pushes: List[Tuple[Document, str]] = []
+        untracked: List[Tuple[Document, str]] = []
+        missing: Dict[str, Tuple[Document, str, str]] = {}
+        for _id, (path, item) in tree.items():
+            if not isinstance(item, Document):
+                continue
+            if _id not in state:
+                if os.path.exists(self._abs(path)):
+                    untracked.append((item, path))
+                else:
+                    pulls.append((item, path, None))
+                continue
+
+            old_path, version, old_hash, _ = state[_id]
+            local_exists = os.path.exists(self._abs(old_path))
+            local_hash = file_hash(self._abs(old_path)) if local_exists \
+                else None
+            local_changed = local_hash != old_hash
+            remote_changed = int(item.Version) != version
+            if local_changed and remote_changed:
+                report.conflicts.append(path)
+            elif remote_changed:
+                pulls.append((item, path, old_path))
+            elif not local_exists:
+                missing[_id] = (item, old_path, old_hash)
+            elif local_changed:
+                if old_path != path:
+                    os.replace(self._abs(old_path), self._abs(path))
+                pushes.append((item, path))
+            elif old_path != path:
+                os.replace(self._abs(old_path), self._abs(path))
+                self.state.set_item(_id, path, version, old_hash,
+                                    item.Type)
+                report.moved.append(path)
+
+        # The state is committed after every phase, so an error or a kill
+        # never loses what was already transferred.
+        self.state.commit()
+        self._adopt(untracked, report)
+        self.state.commit()
+        self._pull(pulls, report)
+        self.state.commit()
+        self._push(pushes, report)
+        self.state.commit()
+
+        known = {s[0] for s in self.state.items().values()}
+        known.update(path for path, _ in tree.values())
+        dirs, files = self._scan()
+        self._create_folders(dirs, known, folder_ids, report)
+        self.state.commit()
+        moved_from = {m[2]: _id for _id, m in missing.items()}
+        moves = []
+        for path in files:
+            if path in known:
+                continue
+            if path.endswith(".zip"):
+                _hash = file_hash(self._abs(path))
+                if moved_from.get(_hash) in missing:
+                    item = missing.pop(moved_from[_hash])[0]
+                    moves.append((item, path, _hash))
+                else:
+                    log.info(f"Ignoring unknown zipfile {path}")
+        self._move(moves, folder_ids, report)
+        self.state.commit()
+        self._upload(files, folder_ids, collection, report)
+        self.state.commit()
+
+        self._delete(tree, state, missing, report)
+        self.state.commit()
+        return report
+
+    def _sync_folders(self, tree: Dict[str, Tuple[str, DocumentOrFolder]],
+                      state: Dict[str, Tuple[str, int, str, str]]) -> None:
+        folders = sorted(((p, i) for p, i in tree.values()
+                          if isinstance(i, Folder)),
+                         key=lambda f: f[0].count("/"))
+        for path, folder in folders:
+            new = self._abs(path)
+            old = state.get(folder.ID)
+            if (old is not None and old[0] != path
+                    and os.path.isdir(self._abs(old[0]))
+                    and not os.path.exists(new)):
+                os.replace(self._abs(old[0]), new)
+                self.state.move_prefix(old[0], path)
+            os.makedirs(new, exist_ok=True)
+            self.state.set_item(folder.ID, path, folder.Version, "",
+                                folder.Type)
+
+    def _adopt(self, untracked: List[Tuple[Document, str]],
+               report: SyncReport) -> None:
+        """Add local zipfiles missing from the state, like the pulls of an
+        interrupted sync, when they are the zipfile in the cloud. Any other
+        zipfile is a conflict."""
+
+        def check(job):
+            document, path = job
+            location = self._abs(path)
+            try:
+                self.client.download_to(document, location + ".part")
+                remote_hash = file_hash(location + ".part")
+                return file_hash(location), remote_hash, None
+            except Exception as e:
+                return None, None, e
+            finally:
+                if os.path.exists(location + ".part"):
+                    os.remove(location + ".part")
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for (document, path), (_hash, remote_hash, error) in zip(
+                    untracked, executor.map(check, untracked)):
+                if error is not None:
+                    log.error(f"Could not check {path}: {error}")
+                    report.errors[path] = error
+                elif _hash == remote_hash:
+                    self.state.set_item(document.ID, path, document.Version,
+                                        _hash, document.Type)
+                else:
+                    report.conflicts.append(path)
+
+    def _pull(self, pulls: List[Tuple[Document, str, Optional[str]]],
+              report: SyncReport) -> None:
+        def pull(job):
+            document, path, old_path = job
+            location = self._abs(path)
+            try:
+                self.client.download_to(document, location + ".part")
+                os.replace(location + ".part", location)
+                if old_path and old_path != path \
+                        and os.path.exists(self._abs(old_path)):
+                    os.remove(self._abs(old_path))
+                return document, path, file_hash(location), None
+            except Exception as e:
+                return document, path, None, e
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for document, path, _hash, error in executor.map(pull, pulls):
+                if error is not None:
+                    log.error(f"Could not pull {path}: {error}")
+                    report.errors[path] = error
+                    continue
+                self.state.set_item(document.ID, path, document.Version,
+                                    _hash, document.Type)
+                report.pulled.append(path)
+
+    def _push(self, pushes: List[Tuple[Document, str]],
+              report: SyncReport) -> None:
+        def push(job):
+            document, path = job
+            try:
+                # Unchanged members are copied from the zipfile as they
+                # are, without reading them into memory.
+                with from_zip(document.ID, self._abs(path),
+                              lazy=True) as zip_doc:
+                    self.client.upload_version(zip_doc,
+                                               int(document.Version) + 1)
+                return None
+            except Exception as e:
+                return e
+
+        uploaded = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for job, error in zip(pushes, executor.map(push, pushes)):
+                if error is None:
+                    uploaded.append(job)
+                else:
+                    log.error(f"Could not push {job[1]}: {error}")
+                    report.errors[job[1]] = error
+        if not uploaded:
+            return
+
+        # A document changed in the cloud since the listing is rejected
+        # because of its version, and not overwritten.
+        self.client.update_metadata_many([d for d, _ in uploaded],
+                                         optimistic=True, retry=False)
+        for document, path in uploaded:
+            if document.Success:
+                self.state.set_item(document.ID, path, document.Version,
+                                    file_hash(self._abs(path)),
+                                    document.Type)
+                report.pushed.append(path)
+            elif document.Conflict:
+                report.conflicts.append(path)
+            else:
+                report.errors[path] = Exception(document.Message)
+
+    def _create_folders(self, dirs: List[str], known: set,
+                        folder_ids: Dict[str, str],
+                        report: SyncReport) -> None:
+        for path in dirs:
+            if path in known:
+                continue
+            parent, _, name = path.rpartition("/")
+            if parent not in folder_ids:
+                continue
+            folder = Folder(name, Parent=folder_ids[parent])
+            try:
+                self.client.create_folder(folder)
+            except Exception as e:
+                report.errors[path] = e
+                continue
+            folder_ids[path] = folder.ID
+            known.add(path)
+            self.state.set_item(folder.ID, path, folder.Version, "",
+                                folder.Type)
+            report.created.append(path)
+
+    def _move(self, moves: List[Tuple[Document, str, str]],
+              folder_ids: Dict[str, str], report: SyncReport) -> None:
+        items = []
+        for item, path, _ in moves:
+            parent, _, name = path.rpartition("/")
+            if parent not in folder_ids:
+                continue
+            item.Parent = folder_ids[parent]
+            item.VissibleName = name[:-len(".zip")]
+            items.append(item)
+        if not items:
+            return
+        self.client.update_metadata_many(items, optimistic=True)
+        for item, path, _hash in moves:
+            if item.Success:
+                self.state.set_item(item.ID, path, item.Version, _hash,
+                                    item.Type)
+                report.moved.append(path)
+            else:
+                report.errors[path] = Exception(item.Message)
+
+    def _upload(self, files: List[str], folder_ids: Dict[str, str],
+                collection: Collection, report: SyncReport) -> None:
+        sources = self.state.sources()
+        versions = {i.ID: int(i.Version) for i in collection}
+        by_parent: Dict[str, List[Tuple[str, str, ZipDocument]]] = {}
+        for path in files:
+            if not path.lower().endswith(UPLOAD_EXTENSIONS):
+                continue
+            parent = path.rpartition("/")[0]
+            if parent not in folder_ids:
+                continue
+            _hash = file_hash(self._abs(path))
+            source = sources.get(path)
+            if source is not None and source[1] == _hash:
+                continue
+            if source is not None and source[0] in versions:
+                zip_doc = ZipDocument(_id=source[0], doc=self._abs(path))
+                zip_doc.metadata["version"] = versions[source[0]] + 1
+            else:
+                zip_doc = ZipDocument(doc=self._abs(path))
+            by_parent.setdefault(folder_ids[parent], []).append(
+                (path, _hash, zip_doc))
+
+        for parent, jobs in by_parent.items():
+            results = self.client.upload_many([j[2] for j in jobs],
+                                              to=Folder(ID=parent),
+                                              workers=self.workers)
+            for (path, _hash, zip_doc), result in zip(jobs, results):
+                zip_doc.close()
+                if result.Success:
+                    self.state.set_source(path, result.ID, _hash)
+                    report.pushed.append(path)
+                else:
+                    report.errors[path] = Exception(result.Message)
+
+    def _delete(self, tree: Dict[str, Tuple[str, DocumentOrFolder]],
+                state: Dict[str, Tuple[str, int, str, str]],
+                missing: Dict[str, Tuple[Document, str, str]],
+                report: SyncReport) -> None:
+        if not self.delete:
+            return
+
+        if missing:
+            self.client.delete_many([m[0] for m in missing.values()])
+            for item, path, _ in missing.values():
+                if item.Success:
+                    self.state.remove_item(item.ID)
+                    report.deleted_remote.append(path)
+                else:
+                    report.errors[path] = Exception(item.Message)
+
+        gone_folders = []
+        for _id, (path, version, _hash, _type) in state.items():
+            if _id in tree:
+                continue
+            location = self._abs(path)
+            if _type == "CollectionType":
+                gone_folders.append((path, _id))
+                continue
+            if os.path.exists(location):
+                if file_hash(location) != _hash:
+                    report.conflicts.append(path)
+                    continue
+                os.remove(location)
+                report.deleted_local.append(path)
+            self.state.remove_item(_id)
+
+        for path, _id in sorted(gone_folders, key=lambda f: -len(f[0])):
+            location = self._abs(path)
+            if os.path.isdir(location):
+                try:
+                    os.rmdir(location)
+                except OSError:
+                    log.info(f"Not removing non empty directory {path}")
+                    continue
+                report.deleted_local.append(path)
+            self.state.remove_item(_id)
+
+    def close(self) -> None:
+        """Close the state database."""
+
+        self.state.close()
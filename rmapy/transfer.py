@@ -0,0 +1,113 @@
+from threading import Condition, Lock
+from time import monotonic
+from typing import Dict, List, Tuple
+
+
+class ByteBudget(object):
+    """A global cap on the number of bytes in flight.
+
+    Workers acquire the size of a transfer before starting it and release it
+    when done. A transfer larger than the limit is let through on its own,
+    so it can never block forever.
+
+    Attributes:
+        limit: The maximum number of bytes in flight.
+        in_flight: The number of bytes currently in flight.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self._cond = Condition()
+
+    def acquire(self, size: int) -> None:
+        """Wait until size bytes fit in the budget and claim them.
+
+        Args:
+            size: The number of bytes to claim.
+        """
+
+        with self._cond:
+            while self.in_flight and self.in_flight + size > self.limit:
+                self._cond.wait()
+            self.in_flight += size
+
+    def release(self, size: int) -> None:
+        """Give back size bytes to the budget.
+
+        Args:
+            size: The number of bytes claimed with acquire.
+        """
+
+        with self._cond:
+            self.in_flight -= size
+            self._cond.notify_all()
+
+
+class TransferSummary(object):
+    """The result of a bulk transfer.
+
+    Attributes:
+        completed: A list of (ID, location) tuples of the transferred
+            documents.
+        errors: A dict mapping the ID of a failed document to its exception.
+        bytes: The total number of bytes transferred.
+        started: The monotonic time the transfer started.
+        finished: The monotonic time the transfer finished.
+    """
+
+    def __init__(self):
+        self.completed: List[Tuple[str, str]] = []
+        self.errors: Dict[str, Exception] = {}
+        self.bytes = 0
+        self.started = monotonic()
+        self.finished = self.started
+        self._lock = Lock()
+
+    def add(self, _id: str, location: str, size: int) -> None:
+        """Record a transferred document."""
+
+        with self._lock:
+            self.completed.append((_id, location))
+            self.bytes += size
+
+    def fail(self, _id: str, error: Exception) -> None:
+        """Record a failed document."""
+
+        with self._lock:
+            self.errors[_id] = error
+
+    def finish(self) -> None:
+        """Mark the transfer as finished."""
+
+        self.finished = monotonic()
+
+    @property
+    def seconds(self) -> float:
+        """The duration of the transfer in seconds."""
+
+        return self.finished - self.started
+
+    @property
+    def bytes_per_second(self) -> float:
+        """The throughput in bytes per second."""
+
+        if self.seconds <= 0:
+            return 0.0
+        return self.bytes / self.seconds
+
+    @property
+    def documents_per_second(self) -> float:
+        """The throughput in documents per second."""
+
+        if self.seconds <= 0:
+            return 0.0
+        return len(self.completed) / self.seconds
+
+    def __str__(self) -> str:
+        return (f"<rmapy.transfer.TransferSummary {len(self.completed)} ok, "
+                f"{len(self.errors)} failed, "
+                f"{self.bytes_per_second / 1e6:.2f} MB/s>")
+
+    def __repr__(self) -> str:
+        return self.__str__()
@@ -0,0 +1,123 @@
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from .document import Document
+from .folder import Folder
+from .const import WATCH_MIN_INTERVAL, WATCH_MAX_INTERVAL
+
+DocumentOrFolder = Union[Document, Folder]
+Index = Dict[str, Tuple[int, str, str]]
+
+CREATED = "created"
+MODIFIED = "modified"
+MOVED = "moved"
+DELETED = "deleted"
+
+
+class ChangeEvent(object):
+    """A change of a meta item between two listings.
+
+    Attributes:
+        kind: One of created, modified, moved or deleted.
+        item: The item from the new listing. For a deleted item, this is the
+            ID, as it is not listed anymore.
+        previous: The (Version, Parent, VissibleName) of the item in the
+            previous listing, or None for a created item.
+    """
+
+    def __init__(self, kind: str, item: Union[DocumentOrFolder, str],
+                 previous: Optional[Tuple[int, str, str]] = None):
+        self.kind = kind
+        self.item = item
+        self.previous = previous
+
+    @property
+    def ID(self) -> str:
+        """The ID of the changed item."""
+
+        if isinstance(self.item, str):
+            return self.item
+        return self.item.ID
+
+    def __str__(self) -> str:
+        return f"<rmapy.watch.ChangeEvent {self.kind} {self.ID}>"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def index(items: Iterable[DocumentOrFolder]) -> Index:
+    """Build the index of a listing to diff against.
+
+    Args:
+        items: The items of a listing.
+    Returns:
+        A dict mapping the ID of every item to its
+        (Version, Parent, VissibleName).
+    """
+
+    return {i.ID: (int(i.Version), i.Parent, i.VissibleName) for i in items}
+
+
+def diff(previous: Index, items: Iterable[DocumentOrFolder]
+         ) -> Tuple[List[ChangeEvent], Index]:
+    """Compute the changes between an indexed listing and a new listing.
+
+    An item with a new Parent is moved, any other item with a new Version
+    is modified.
+
+    Args:
+        previous: The index of the previous listing.
+        items: The items of the new listing.
+    Returns:
+        A tuple of the events and the index of the new listing.
+    """
+
+    events: List[ChangeEvent] = []
+    current: Index = {}
+    for item in items:
+        entry = (int(item.Version), item.Parent, item.VissibleName)
+        current[item.ID] = entry
+        old = previous.get(item.ID)
+        if old is None:
+            events.append(ChangeEvent(CREATED, item))
+        elif old[1] != entry[1]:
+            events.append(ChangeEvent(MOVED, item, old))
+        elif old != entry:
+            events.append(ChangeEvent(MODIFIED, item, old))
+    for _id, old in previous.items():
+        if _id not in current:
+            events.append(ChangeEvent(DELETED, _id, old))
+    return events, current
+
+
+class PollInterval(object):
+    """An adaptive polling interval.
+
+    The interval drops to min_interval when there was activity and grows by
+    backoff after every idle poll, up to max_interval.
+
+    Attributes:
+        value: The number of seconds to wait before the next poll.
+    """
+
+    def __init__(self, min_interval: float = WATCH_MIN_INTERVAL,
+                 max_interval: float = WATCH_MAX_INTERVAL,
+                 backoff: float = 2.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.value = min_interval
+
+    def update(self, active: bool) -> float:
+        """Adapt the interval to the result of the last poll.
+
+        Args:
+            active: Whether the last poll found changes.
+        Returns:
+            The number of seconds to wait before the next poll.
+        """
+
+        if active:
+            self.value = self.min_interval
+        else:
+            self.value = min(self.value * self.backoff, self.max_interval)
+        return self.value